@@ -1,8 +1,25 @@
+import argparse
+import threading
+
 import pygame
 import sys
 
 from client import Pixoo
-pixoo = Pixoo("11:75:58:81:e8:b6")
+
+parser = argparse.ArgumentParser(description="Type text and scroll it across the Pixoo")
+parser.add_argument("--device", default=Pixoo.BDADDR, help="device address")
+parser.add_argument("--server", help="draw through the frame server on this socket instead, as an overlay")
+parser.add_argument("--hold", type=float, default=10.0,
+                    help="with --server, seconds to show each text before handing back the display")
+cli_args = parser.parse_args()
+
+release_timer = None
+if cli_args.server:
+    from frame_server import OVERLAY, FrameServerClient
+
+    pixoo = FrameServerClient(cli_args.server, OVERLAY, "text")
+else:
+    pixoo = Pixoo(cli_args.device)
 pixoo.connect()
 pygame.init()
 
@@ -24,6 +41,13 @@ while True:
             elif event.key == pygame.K_RETURN:  # Perform an action on pressing Enter
                 print("Action with input:", input_string)
                 pixoo.draw_text(str(input_string), 12, 100, (255, 0, 0), (0, 0, 0))
+                if cli_args.server:
+                    # let whatever was showing before (the game) take over again
+                    if release_timer is not None:
+                        release_timer.cancel()
+                    release_timer = threading.Timer(cli_args.hold, pixoo.release)
+                    release_timer.daemon = True
+                    release_timer.start()
                 input_string = ""  # Clear the input string after the action
             else:
                 if event.unicode:  # Check if the pressed key has a unicode representation
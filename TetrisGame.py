@@ -1,9 +1,45 @@
-import pygame
+import argparse
+import os
 import random
-import time
 
+import pygame
+import time
 
-def run_tetris_game():
+import tetris_engine
+from audio import AudioService
+from autoplay import AutoPlayer
+from device_profile import PROFILES, get_profile
+from game_loop import GameScheduler
+from tetris_engine import TetrisEngine
+from tetris_render import BoardRenderer
+
+KEY_ACTIONS = {
+    pygame.K_LEFT: tetris_engine.LEFT,
+    pygame.K_RIGHT: tetris_engine.RIGHT,
+    pygame.K_DOWN: tetris_engine.DOWN,
+    pygame.K_UP: tetris_engine.ROTATE,
+}
+
+
+def run_tetris_game(frame_bus=None, image_path="image.png", seed=None, preview=True, preview_fps=10, trace=False,
+                    tick_rate=60, input_hz=250, output_fps=10, das=0.17, arr=0.05, record_path=None,
+                    attract=None, music="tetris.mid", profile=None):
+    """
+    Run the game. The simulation runs at a fixed tick_rate with gravity set
+    by the level; keys are polled input_hz times a second and held keys
+    repeat after das seconds, every arr seconds. When the board changed, it
+    is rendered at device resolution at most output_fps times a second and
+    published as a raw RGB frame on frame_bus, or saved to image_path when no
+    bus is given. The scaled-up preview window is optional and redrawn at
+    most preview_fps times a second. With trace, tick and render timestamps
+    travel with each frame for the sender's frame tracer. With record_path,
+    the session is recorded as a replay (see replay.py). With attract, the
+    autoplay bot takes over after that many idle seconds (0: right away)
+    until a key is pressed. music is the MIDI soundtrack (None for silence);
+    it speeds up with the level, and line clears and game over play effects.
+    Frames are rendered at the resolution of profile (a DeviceProfile or its
+    name), each cell a square of pixels on panels larger than the board.
+    """
     # Initialize Pygame
     pygame.init()
 
@@ -13,182 +49,152 @@ def run_tetris_game():
     GRID_SIZE = 50
     GRID_WIDTH = SCREEN_WIDTH // GRID_SIZE
     GRID_HEIGHT = SCREEN_HEIGHT // GRID_SIZE
+    profile = get_profile(profile)
+    cell_pixels = max(min(profile.width // GRID_WIDTH, profile.height // GRID_HEIGHT), 1)
 
-    # Colors
-    BLACK = (0, 0, 0)
-    WHITE = (255, 255, 255)
-    CYAN = (0, 255, 255)
-    MAGENTA = (255, 0, 255)
-    YELLOW = (255, 255, 0)
-    GREEN = (0, 255, 0)
-    RED = (255, 0, 0)
-    BLUE = (0, 0, 255)
-
-    BACKGROUND = (0, 0, 0)
-
-    # Tetromino shapes
-    SHAPES = [
-        [[1, 1, 1, 1]],
-        [[1, 1], [1, 1]],
-        [[1, 1, 1], [0, 1, 0]],
-        [[1, 1, 1], [1, 0, 0]],
-        [[1, 1, 1], [0, 0, 1]],
-        [[1, 1, 1], [0, 1, 0]],
-        [[1, 1, 1], [1, 0, 0]]
-    ]
-
-    SHAPES_COLORS = [CYAN, YELLOW, GREEN, RED, BLUE, MAGENTA, WHITE]
-
-    # Initialize the screen
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    # Initialize the screen; without a preview a tiny window still collects key presses
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT) if preview else (1, 1))
     pygame.display.set_caption("Tetris")
 
     # Initialize clock
     clock = pygame.time.Clock()
 
-    # Initialize variables
-    grid = [[0] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
-    colors_grid = [[None] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
-
-    current_shape = None
-    current_shape_color = None
-    current_shape_x = 0
-    current_shape_y = 0
-    score = 0
-    game_over = False
-    game_over_time = 0
-    restart_delay = 5
-
-    def draw_grid():
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                pygame.draw.rect(screen, BACKGROUND, (x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE), 1)
-
-    def draw_shape(shape, color, x, y):
-        for row in range(len(shape)):
-            for col in range(len(shape[row])):
-                if shape[row][col]:
-                    pygame.draw.rect(screen, color, ((x + col) * GRID_SIZE, (y + row) * GRID_SIZE, GRID_SIZE, GRID_SIZE))
-
-    def check_collision(shape, x, y):
-        for row in range(len(shape)):
-            for col in range(len(shape[row])):
-                if shape[row][col]:
-                    if x + col < 0 or x + col >= GRID_WIDTH or y + row >= GRID_HEIGHT or grid[y + row][x + col]:
-                        return True
-        return False
-
-    def place_shape(shape, color, x, y):
-        for row in range(len(shape)):
-            for col in range(len(shape[row])):
-                if shape[row][col]:
-                    grid[y + row][x + col] = 1
-                    colors_grid[y + row][x + col] = color
-
-    def clear_rows():
-        nonlocal score
-        full_rows = []
-        for row in range(GRID_HEIGHT):
-            if all(grid[row]):
-                full_rows.append(row)
-
-        for row in full_rows:
-            del grid[row]
-            del colors_grid[row]
-            grid.insert(0, [0] * GRID_WIDTH)
-            colors_grid.insert(0, [None] * GRID_WIDTH)
-            score += 100
-
-    def generate_new_shape():
-        nonlocal current_shape, current_shape_color, current_shape_x, current_shape_y
-        current_shape = random.choice(SHAPES)
-        current_shape_color = random.choice(SHAPES_COLORS)
-        current_shape_x = GRID_WIDTH // 2 - len(current_shape[0]) // 2
-        current_shape_y = 0
+    if record_path is not None and seed is None:
+        seed = random.randrange(2 ** 32)  # replays need to know the seed
+        print(f"Recording with seed {seed}")
+
+    # Game state lives in the engine, this loop only feeds it input and draws it
+    engine = TetrisEngine(GRID_WIDTH, GRID_HEIGHT, seed)
+    scheduler = GameScheduler(engine, tick_rate, das, arr)
+    replay_writer = None
+    if record_path is not None:
+        from replay import ReplayWriter
+
+        replay_writer = ReplayWriter(record_path, seed, GRID_WIDTH, GRID_HEIGHT, tick_rate)
+        scheduler.on_action = replay_writer.record
+    renderer = BoardRenderer(GRID_WIDTH, GRID_HEIGHT, scale=cell_pixels)
+    # device resolution, sharing memory with the renderer's buffer
+    board_surface = pygame.image.frombuffer(renderer.buffer, renderer.size, "RGB")
+    audio = AudioService(music).start() if music else None
+    last_lines = engine.lines
+    last_level = engine.level
+    game_over_time = None
+    bot = None
+    last_input = time.monotonic()
+    next_output = 0
+    next_preview = 0
+    preview_dirty = True
+    last_time = time.monotonic()
 
     # Game loop
-    generate_new_shape()
     running = True
 
     while running:
-        current_time = time.time()
+        current_time = time.monotonic()
+        tick_ns = time.monotonic_ns() if trace else 0
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-
-            if not game_over:
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_LEFT:
-                        if not check_collision(current_shape, current_shape_x - 1, current_shape_y):
-                            current_shape_x -= 1
-                    elif event.key == pygame.K_RIGHT:
-                        if not check_collision(current_shape, current_shape_x + 1, current_shape_y):
-                            current_shape_x += 1
-                    elif event.key == pygame.K_DOWN:
-                        if not check_collision(current_shape, current_shape_x, current_shape_y + 1):
-                            current_shape_y += 1
-                    elif event.key == pygame.K_UP:
-                        # Rotate the shape
-                        new_shape = [[current_shape[y][x] for y in range(len(current_shape))] for x in
-                                    range(len(current_shape[0]))]
-                        new_shape.reverse()
-                        if not check_collision(new_shape, current_shape_x, current_shape_y):
-                            current_shape = new_shape
-
-        if not game_over:
-            if not check_collision(current_shape, current_shape_x, current_shape_y + 1):
-                current_shape_y += 1
-            else:
-                place_shape(current_shape, current_shape_color, current_shape_x, current_shape_y)
-                clear_rows()
-                generate_new_shape()
-                current_shape_y = 0
-
-                if check_collision(current_shape, current_shape_x, current_shape_y):
-                    game_over = True
-                    game_over_time = current_time
-
-        screen.fill(BACKGROUND)
-        draw_grid()
-
-        for row in range(GRID_HEIGHT):
-            for col in range(GRID_WIDTH):
-                if grid[row][col]:
-                    pygame.draw.rect(screen, colors_grid[row][col],
-                                     (col * GRID_SIZE, row * GRID_SIZE, GRID_SIZE, GRID_SIZE))
-
-        draw_shape(current_shape, current_shape_color, current_shape_x, current_shape_y)
-        pygame.display.flip()
-
-        try:
-            # shrink the image to 16x16
-            small_screen = pygame.Surface((16, 16))
-            pygame.transform.scale(screen, (16, 16), small_screen)
-            pygame.image.save(small_screen, "image.png")
-
-        except Exception as e:
-            print(f"An error occurred: {e}")
-
-        clock.tick(2)
-        if game_over:
-            print("GAME OVER")
-
-            if current_time - game_over_time >= 10:
-                game_over = False
-                grid = [[0] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
-                colors_grid = [[None] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
-                score = 0
-                generate_new_shape()
-                game_over_time = 0
+            elif event.type == pygame.KEYDOWN and event.key in KEY_ACTIONS:
+                last_input = current_time
+                bot = None  # a player is back
+                scheduler.press(KEY_ACTIONS[event.key])
+            elif event.type == pygame.KEYUP and event.key in KEY_ACTIONS:
+                scheduler.release(KEY_ACTIONS[event.key])
+
+        if attract is not None and current_time - last_input >= attract:
+            if bot is None:
+                bot = AutoPlayer(engine)
+            action = bot.update(current_time)
+            if action is not None:
+                scheduler.tap(action)
+
+        scheduler.advance(current_time - last_time)
+        last_time = current_time
+
+        if audio is not None and engine.lines != last_lines:
+            if engine.lines > last_lines:
+                audio.lines_cleared(engine.lines - last_lines)
+            if engine.level != last_level:
+                audio.level_up(engine.level)
+            last_lines, last_level = engine.lines, engine.level
+
+        if engine.game_over:
+            if game_over_time is None:
+                game_over_time = current_time
+                print("GAME OVER")
+                if audio is not None:
+                    audio.game_over()
+            elif current_time - game_over_time >= 10:
+                scheduler.reset()
+                game_over_time = None
+                last_lines, last_level = engine.lines, engine.level
+                if audio is not None:
+                    audio.new_game()
+
+        # only changed boards are rendered and sent, and no more than output_fps of them
+        if current_time >= next_output and renderer.render(engine):
+            next_output = current_time + 1 / output_fps
+            preview_dirty = True
+            try:
+                if frame_bus is not None:
+                    frame_bus.publish(renderer.buffer, (tick_ns, time.monotonic_ns()) if trace else None)
+                else:
+                    # write next to the target and swap, so readers never see a half-written file
+                    tmp_path = image_path + ".tmp.png"
+                    pygame.image.save(board_surface, tmp_path)
+                    os.replace(tmp_path, image_path)
+
+            except Exception as e:
+                print(f"An error occurred: {e}")
+
+        if preview and preview_dirty and current_time >= next_preview:
+            screen.blit(pygame.transform.scale(board_surface, (SCREEN_WIDTH, SCREEN_HEIGHT)), (0, 0))
+            pygame.display.flip()
+            next_preview = current_time + 1 / preview_fps
+            preview_dirty = False
+
+        clock.tick(input_hz)
+
+    if replay_writer is not None:
+        replay_writer.finish(engine)
+    if audio is not None:
+        audio.stop()
 
     # Close the game
     pygame.quit()
     exit()
 
 
-
 if __name__ == "__main__":
-
-
-    run_tetris_game()
+    parser = argparse.ArgumentParser(description="Tetris for the Pixoo backpack")
+    parser.add_argument("--bus", metavar="NAME",
+                        help="publish frames on the shared-memory frame bus NAME instead of image.png")
+    parser.add_argument("--seed", type=int, help="seed for the piece sequence")
+    parser.add_argument("--no-preview", action="store_true", help="do not draw the large preview window")
+    parser.add_argument("--preview-fps", type=float, default=10, help="max preview window refresh rate")
+    parser.add_argument("--trace", action="store_true", help="send tick/render timestamps with each frame")
+    parser.add_argument("--tick-rate", type=float, default=60, help="simulation ticks per second")
+    parser.add_argument("--output-fps", type=float, default=10, help="max frames sent to the device per second")
+    parser.add_argument("--das", type=float, default=0.17, help="seconds a key is held before it repeats")
+    parser.add_argument("--arr", type=float, default=0.05, help="seconds between key repeats (0: every tick)")
+    parser.add_argument("--no-repeat", action="store_true", help="disable key repeat")
+    parser.add_argument("--record", metavar="PATH", help="record the session as a replay file")
+    parser.add_argument("--music", default="tetris.mid", help="MIDI soundtrack")
+    parser.add_argument("--no-audio", action="store_true", help="no music or sound effects")
+    parser.add_argument("--attract", type=float, metavar="SECONDS",
+                        help="let the bot play after this many idle seconds (0: from the start)")
+    parser.add_argument("--profile", choices=list(PROFILES), default="16", help="panel resolution")
+    cli_args = parser.parse_args()
+
+    frame_bus = None
+    if cli_args.bus:
+        from frame_bus import SharedFrameBus
+
+        frame_bus = SharedFrameBus(cli_args.bus, get_profile(cli_args.profile).frame_size)
+    run_tetris_game(frame_bus, seed=cli_args.seed, preview=not cli_args.no_preview, preview_fps=cli_args.preview_fps,
+                    trace=cli_args.trace, tick_rate=cli_args.tick_rate, output_fps=cli_args.output_fps,
+                    das=None if cli_args.no_repeat else cli_args.das, arr=cli_args.arr,
+                    record_path=cli_args.record, attract=cli_args.attract,
+                    music=None if cli_args.no_audio else cli_args.music, profile=cli_args.profile)
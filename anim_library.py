@@ -0,0 +1,220 @@
+"""
+Precompiled animation library.
+
+"Compiling" a folder turns every GIF in it, and every sub-directory of
+frame_*.png files (the draw_anim layout), into ready-to-send 0x49 packets
+stored back to back in one file. Playback memory-maps the file and writes
+slices of it to the socket: no decoding or encoding at display time.
+
+File layout:
+    header  b"PXAL", u16 version, u16 reserved, u64 index offset, u32 index size
+    data    packets of every entry, concatenated
+    index   JSON: {profile, chunk_size,
+                   entries: {name: {offset, packets: [sizes], speed, signature, digest}}}
+
+Packets are built for one device profile and chunk size; a library is only
+loaded for the profile it was compiled for. Recompiling only re-encodes
+entries whose source changed: unchanged (mtime, size) signatures, or
+unchanged content hashes, reuse the old bytes.
+
+    python anim_library.py gif_folder gif_folder.pxal --profile 16
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+from client import Pixoo
+from device_profile import PROFILES, get_profile
+
+MAGIC = b"PXAL"
+VERSION = 2
+HEADER = struct.Struct("<4sHHQI")
+
+
+def find_sources(folder):
+    """
+    {entry name: [source files]} for the GIFs and frame directories in folder.
+    """
+    sources = {}
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path) and name.lower().endswith(".gif"):
+            sources[name] = [path]
+        elif os.path.isdir(path):
+            frames = sorted(f for f in os.listdir(path) if f.startswith("frame_") and f.endswith(".png"))
+            if frames:
+                sources[name] = [os.path.join(path, f) for f in frames]
+    return sources
+
+
+def source_signature(paths):
+    return [[os.path.basename(p), os.stat(p).st_mtime_ns, os.stat(p).st_size] for p in paths]
+
+
+def source_digest(paths):
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class AnimLibrary:
+    """
+    Read-only view of a compiled library. Raises ValueError if it was not
+    compiled for profile (a DeviceProfile or its name, 16x16 by default).
+    """
+
+    def __init__(self, path, profile=None):
+        self.path = path
+        profile = get_profile(profile)
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, _, index_offset, index_size = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} animation library")
+            header = json.loads(self._map[index_offset:index_offset + index_size])
+            if header["profile"] != profile.name or header["chunk_size"] != profile.chunk_size:
+                raise ValueError(f"{path} was compiled for the {header['profile']} profile with "
+                                 f"{header['chunk_size']}-byte chunks, not for {profile}")
+        except Exception:
+            self._file.close()
+            raise
+        self.profile = profile
+        self.index = header["entries"]
+        self._view = memoryview(self._map)
+
+    def names(self):
+        return list(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def packets(self, name):
+        """
+        Packets of an entry, as memoryview slices of the mapped file.
+        """
+        entry = self.index[name]
+        offset = entry["offset"]
+        packets = []
+        for size in entry["packets"]:
+            packets.append(self._view[offset:offset + size])
+            offset += size
+        return packets
+
+    def entry_bytes(self, name):
+        """
+        All packets of an entry as one bytes object (a copy).
+        """
+        entry = self.index[name]
+        return self._map[entry["offset"]:entry["offset"] + sum(entry["packets"])]
+
+    def play(self, pixoo, name):
+        """
+        Send an entry to the device.
+        """
+        return pixoo.draw_packets(self.packets(name))
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def compile_library(folder, library_path, speed=100, verbose=False, profile=None):
+    """
+    (Re)build library_path from folder for profile (a DeviceProfile or its
+    name, 16x16 by default), reusing unchanged entries of a library compiled
+    for the same profile. Returns {"compiled": n, "reused": n}.
+    """
+    profile = get_profile(profile)
+    old = None
+    if os.path.exists(library_path):
+        try:
+            old = AnimLibrary(library_path, profile)
+        except (ValueError, KeyError, struct.error, json.JSONDecodeError):
+            old = None
+
+    # only used to encode, it never connects
+    encoder = Pixoo(folder, cache=False, connection=False, profile=profile)
+    index = {}
+    counts = {"compiled": 0, "reused": 0}
+    tmp_path = library_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as out:
+            out.write(b"\0" * HEADER.size)
+            offset = HEADER.size
+            for name, paths in find_sources(folder).items():
+                signature = source_signature(paths)
+                previous = old.index.get(name) if old is not None else None
+                blob = None
+                digest = None
+                if previous is not None and previous["speed"] == speed:
+                    if previous["signature"] == signature:
+                        digest = previous["digest"]
+                    else:
+                        digest = source_digest(paths)
+                        if digest != previous["digest"]:
+                            digest = None
+                    if digest is not None:
+                        blob = old.entry_bytes(name)
+                        sizes = previous["packets"]
+                        counts["reused"] += 1
+                if blob is None:
+                    if len(paths) == 1 and paths[0].lower().endswith(".gif"):
+                        packets = encoder.gif_packets(paths[0], speed)
+                    else:
+                        packets = encoder.anim_packets(os.path.dirname(paths[0]), speed)
+                    blob = b"".join(packets)
+                    sizes = [len(packet) for packet in packets]
+                    digest = source_digest(paths)
+                    counts["compiled"] += 1
+                    if verbose:
+                        print(f"Compiled {name}: {len(packets)} packets")
+
+                index[name] = {
+                    "offset": offset,
+                    "packets": sizes,
+                    "speed": speed,
+                    "signature": signature,
+                    "digest": digest,
+                }
+                out.write(blob)
+                offset += len(blob)
+
+            index_data = json.dumps({"profile": profile.name, "chunk_size": profile.chunk_size,
+                                     "entries": index}).encode()
+            out.write(index_data)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, VERSION, 0, offset, len(index_data)))
+    finally:
+        if old is not None:
+            old.close()
+    # readers that still map the old file keep a valid view of it
+    os.replace(tmp_path, library_path)
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile a folder of animations into a Pixoo library")
+    parser.add_argument("folder")
+    parser.add_argument("library", nargs="?", help="output file (default: FOLDER.pxal)")
+    parser.add_argument("--speed", type=int, default=100, help="frame delay in ms")
+    parser.add_argument("--profile", choices=list(PROFILES), default="16", help="panel resolution")
+    cli_args = parser.parse_args()
+
+    library_path = cli_args.library or cli_args.folder.rstrip("/") + ".pxal"
+    result = compile_library(cli_args.folder, library_path, cli_args.speed, verbose=True, profile=cli_args.profile)
+    print(f"{library_path}: {result['compiled']} compiled, {result['reused']} reused")
@@ -0,0 +1,257 @@
+"""
+Background music and sound effects for the game.
+
+The soundtrack is a MIDI file played by pygame.mixer.music. Its tempo is
+changed by rewriting the file's set-tempo meta events in memory, so the
+music speeds up with the game. A watcher thread that sleeps between checks
+restarts the track when it ends, instead of spinning on get_busy().
+Sound effects are synthesized once at start-up.
+"""
+import io
+import struct
+import threading
+from time import thread_time
+
+import numpy as np
+import pygame
+
+DEFAULT_TEMPO = 500000  # microseconds per quarter note when a file sets none
+
+
+def _read_varlen(data, pos):
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, pos
+
+
+def tempo_events(track):
+    """
+    Offsets of the 3-byte data of the set-tempo meta events in an MTrk
+    chunk body.
+    """
+    offsets = []
+    pos = 0
+    status = None
+    while pos < len(track):
+        _, pos = _read_varlen(track, pos)
+        byte = track[pos]
+        if byte == 0xFF:  # meta event
+            kind = track[pos + 1]
+            length, pos = _read_varlen(track, pos + 2)
+            if kind == 0x51 and length == 3:
+                offsets.append(pos)
+            pos += length
+        elif byte in (0xF0, 0xF7):  # sysex
+            length, pos = _read_varlen(track, pos + 1)
+            pos += length
+        else:
+            if byte & 0x80:
+                status = byte
+                pos += 1
+            # running status: data bytes follow the previous status byte
+            pos += 1 if status >> 4 in (0xC, 0xD) else 2
+    return offsets
+
+
+def scale_tempo(midi, factor):
+    """
+    Copy of a MIDI file playing factor times faster. Raises ValueError if
+    the file is malformed.
+    """
+    try:
+        return _scale_tempo(midi, factor)
+    except (IndexError, TypeError, struct.error) as e:
+        raise ValueError(f"Malformed MIDI file: {e}") from None
+
+
+def _scale_tempo(midi, factor):
+    data = bytearray(midi)
+    pos = 14  # after the MThd chunk
+    tracks = []
+    found = False
+    while pos + 8 <= len(data):
+        kind, length = struct.unpack_from(">4sI", data, pos)
+        body = pos + 8
+        if kind == b"MTrk":
+            tracks.append(pos)
+            for offset in tempo_events(data[body:body + length]):
+                tempo = int.from_bytes(data[body + offset:body + offset + 3], "big")
+                data[body + offset:body + offset + 3] = max(1, min(int(tempo / factor), 0xFFFFFF)).to_bytes(3, "big")
+                found = True
+        pos = body + length
+    if not found and tracks:
+        # no tempo event: put one at the start of the first track
+        first = tracks[0]
+        tempo = int(DEFAULT_TEMPO / factor).to_bytes(3, "big")
+        data[first + 8:first + 8] = b"\x00\xff\x51\x03" + tempo
+        length = struct.unpack_from(">I", data, first + 4)[0]
+        struct.pack_into(">I", data, first + 4, length + 7)
+    return bytes(data)
+
+
+def tone(frequencies, note_length=0.06, volume=0.4, sample_rate=44100, channels=2):
+    """
+    A short square-wave arpeggio as an int16 sample array.
+    """
+    samples = int(note_length * sample_rate)
+    t = np.arange(samples) / sample_rate
+    envelope = np.linspace(1.0, 0.0, samples) ** 2
+    notes = [np.sign(np.sin(2 * np.pi * frequency * t)) * envelope for frequency in frequencies]
+    wave = (np.concatenate(notes) * volume * 32767).astype(np.int16)
+    if channels > 1:
+        wave = np.repeat(wave[:, None], channels, axis=1)
+    return np.ascontiguousarray(wave)
+
+
+def tempo_for_level(level):
+    """
+    Music speed for a game level: 8% faster per level, at most twice as fast.
+    """
+    return min(1.0 + 0.08 * level, 2.0)
+
+
+class AudioService:
+    """
+    Plays the soundtrack in a loop and short effects on request. All calls
+    return immediately. If the mixer or the MIDI file cannot be opened, the
+    service prints why and stays silent instead of failing the game.
+    """
+
+    def __init__(self, midi_path="tetris.mid", volume=0.5, loop=True, poll_interval=0.25):
+        self.midi_path = midi_path
+        self.volume = volume
+        self.loop = loop
+        self.poll_interval = poll_interval
+        self.tempo = 1.0
+        self.enabled = False
+        self.sounds = {}
+        self.loops_played = 0
+        self.wakeups = 0
+        self.watcher_cpu = 0.0
+        self.finished = threading.Event()
+        self._midi = None
+        self._music = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+        except pygame.error as e:
+            print(f"Audio disabled: {e}")
+            self.finished.set()  # nothing will play
+            return self
+        self.enabled = True
+        frequency, _, channels = pygame.mixer.get_init()
+
+        def effect(notes, note_length=0.06):
+            return pygame.sndarray.make_sound(tone(notes, note_length, sample_rate=frequency, channels=channels))
+
+        self.sounds = {
+            "line": effect([523, 659, 784]),
+            "tetris": effect([523, 659, 784, 1047, 784, 1047], 0.07),
+            "game_over": effect([392, 330, 262, 196], 0.15),
+            "level": effect([784, 988, 1175, 1568], 0.05),
+        }
+        try:
+            with open(self.midi_path, "rb") as f:
+                self._midi = f.read()
+            self._play()
+        except (OSError, ValueError, pygame.error) as e:
+            print(f"Music disabled: {e}")
+            self._midi = None
+            self.finished.set()
+        self._thread = threading.Thread(target=self._watch, name="audio-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def _play(self):
+        """
+        (Re)start the track at the current tempo.
+        """
+        with self._lock:
+            data = self._midi if self.tempo == 1.0 else scale_tempo(self._midi, self.tempo)
+            pygame.mixer.music.load(io.BytesIO(data), "mid")
+            pygame.mixer.music.set_volume(self.volume)
+            pygame.mixer.music.play()
+            self._music = True
+            self.loops_played += 1
+
+    def _watch(self):
+        # wakes up a few times a second; the mixer does the actual playing
+        while not self._stop.wait(self.poll_interval):
+            started = thread_time()
+            self.wakeups += 1
+            if self._music and not pygame.mixer.music.get_busy():
+                if self.loop:
+                    try:
+                        self._play()
+                    except (ValueError, pygame.error) as e:
+                        print(f"Music stopped: {e}")
+                        self._music = False
+                        self.finished.set()
+                else:
+                    self._music = False
+                    self.finished.set()
+            self.watcher_cpu += thread_time() - started
+        self.finished.set()
+
+    def set_tempo(self, factor):
+        """
+        Change the music speed. The track restarts at the new tempo.
+        """
+        if factor == self.tempo:
+            return
+        self.tempo = factor
+        if self.enabled and self._midi is not None:
+            try:
+                self._play()
+            except (ValueError, pygame.error) as e:
+                print(f"Music stopped: {e}")
+
+    def play(self, name):
+        sound = self.sounds.get(name)
+        if sound is not None:
+            sound.play()
+
+    def lines_cleared(self, count):
+        self.play("tetris" if count >= 4 else "line")
+
+    def level_up(self, level):
+        self.play("level")
+        self.set_tempo(tempo_for_level(level))
+
+    def game_over(self):
+        if self.enabled:
+            pygame.mixer.music.stop()
+            self._music = False
+        self.play("game_over")
+
+    def new_game(self):
+        self.tempo = None  # force a restart at level 0 speed
+        self.set_tempo(1.0)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "tempo": self.tempo,
+            "loops_played": self.loops_played,
+            "wakeups": self.wakeups,
+            "watcher_cpu": self.watcher_cpu,
+        }
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.enabled:
+            pygame.mixer.music.stop()
+            self._music = False
+
@@ -0,0 +1,237 @@
+"""
+Tetris bot for attract mode (and batch_sim's "bot" policy).
+
+For the falling piece every distinct rotation and column is dropped
+straight down from where the piece is and scored with a board heuristic;
+the most promising placements are then re-scored by the best placement of
+the next piece on the resulting board. Boards are tuples of row bitmasks,
+so a candidate costs one small tuple, and the board features (aggregate
+height, holes, bumpiness) are memoized per board since different move
+orders keep reaching the same boards. The search is a generator, so
+AutoPlayer can spread it over game ticks within a time budget.
+"""
+from functools import lru_cache
+from time import perf_counter
+
+import tetris_engine
+
+# board heuristic weights (aggregate height, lines cleared, holes, bumpiness)
+WEIGHTS = (-0.510066, 0.760666, -0.35663, -0.184483)
+
+
+def distinct_rotations(shape):
+    """
+    (rotation, piece) for the rotations of a shape that differ.
+    """
+    seen = []
+    for rotation, piece in enumerate(tetris_engine.PIECES[shape]):
+        if piece not in seen:
+            seen.append(piece)
+            yield rotation, piece
+
+
+@lru_cache(maxsize=1 << 16)
+def board_features(rows, width):
+    """
+    (aggregate height, holes, bumpiness) of a board given as a tuple of row
+    bitmasks.
+    """
+    height = len(rows)
+    heights = [0] * width
+    seen = 0
+    holes = 0
+    for i, row in enumerate(rows):
+        holes += (seen & ~row).bit_count()
+        new = row & ~seen
+        while new:
+            low = new & -new
+            heights[low.bit_length() - 1] = height - i
+            new ^= low
+        seen |= row
+    bumpiness = 0
+    previous = heights[0]
+    for column_height in heights:
+        bumpiness += abs(column_height - previous)
+        previous = column_height
+    return sum(heights), holes, bumpiness
+
+
+def evaluate(rows, width, cleared, weights=WEIGHTS):
+    aggregate, holes, bumpiness = board_features(rows, width)
+    w_height, w_lines, w_holes, w_bumps = weights
+    return w_height * aggregate + w_lines * cleared + w_holes * holes + w_bumps * bumpiness
+
+
+@lru_cache(maxsize=None)
+def piece_bottoms(piece):
+    """
+    For each column of a piece, the row just below its lowest cell.
+    """
+    masks, w, h = piece
+    return tuple(max(i + 1 for i, mask in enumerate(masks) if mask >> col & 1) for col in range(w))
+
+
+@lru_cache(maxsize=1 << 12)
+def surface(rows, width):
+    """
+    Topmost filled row of each column (len(rows) if the column is empty).
+    """
+    tops = [len(rows)] * width
+    seen = 0
+    for i, row in enumerate(rows):
+        new = row & ~seen
+        while new:
+            low = new & -new
+            tops[low.bit_length() - 1] = i
+            new ^= low
+        seen |= row
+    return tops
+
+
+def placements(rows, width, piece, y):
+    """
+    Yield (x, new rows, lines cleared) for every column the piece can drop
+    into from row y.
+    """
+    masks, w, h = piece
+    height = len(rows)
+    full_row = (1 << width) - 1
+    bottoms = piece_bottoms(piece)
+    tops = surface(rows, width)
+    for x in range(width - w + 1):
+        # resting on the surface, unless the piece is already below it
+        top = min(tops[x + col] - bottom for col, bottom in enumerate(bottoms))
+        if top < y:
+            shifted = [mask << x for mask in masks]
+            if any(rows[y + i] & mask for i, mask in enumerate(shifted)):
+                continue  # blocked where the piece is now
+            top = y
+            while top + h < height and not any(rows[top + 1 + i] & mask for i, mask in enumerate(shifted)):
+                top += 1
+        new_rows = list(rows)
+        for i, mask in enumerate(masks):
+            new_rows[top + i] |= mask << x
+        if full_row in new_rows:
+            kept = [row for row in new_rows if row != full_row]
+            cleared = height - len(kept)
+            yield x, tuple([0] * cleared + kept), cleared
+        else:
+            yield x, tuple(new_rows), 0
+
+
+def search(rows, width, shape, y, next_shape=None, weights=WEIGHTS, beam=8):
+    """
+    Generator looking for the best (rotation, x) for shape falling at row
+    y. With next_shape, the beam best placements are re-scored by the best
+    follow-up placement of the next piece. Yields None between slices of
+    work (so the caller can pause it) and finally the best
+    (score, rotation, x), or None if nothing fits.
+    """
+    candidates = []
+    for rotation, piece in distinct_rotations(shape):
+        for x, after, cleared in placements(rows, width, piece, y):
+            candidates.append((evaluate(after, width, cleared, weights), rotation, x, after, cleared))
+            yield None
+    if not candidates:
+        yield None
+        return
+    if next_shape is None:
+        yield max(candidates, key=lambda c: c[0])[:3]
+        return
+
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    best = None
+    for _, rotation, x, after, cleared in candidates[:beam]:
+        score = None
+        for _, next_piece in distinct_rotations(next_shape):
+            for _, after_next, cleared_next in placements(after, width, next_piece, 0):
+                candidate = evaluate(after_next, width, cleared + cleared_next, weights)
+                if score is None or candidate > score:
+                    score = candidate
+                yield None
+        if score is None:  # the next piece would not fit: game over
+            score = evaluate(after, width, cleared, weights) - 1000
+        if best is None or score > best[0]:
+            best = (score, rotation, x)
+    yield best
+
+
+def best_placement(engine, lookahead=True, weights=WEIGHTS):
+    """
+    (rotation, x) for the falling piece, searched to completion.
+    """
+    result = None
+    for result in search(tuple(engine.rows), engine.width, engine.shape, engine.y,
+                         engine.next_shape if lookahead else None, weights):
+        pass
+    return None if result is None else result[1:]
+
+
+def next_move(engine, target):
+    """
+    Next action to bring the falling piece to target (rotation, x), or DOWN
+    once it is there. Worked out from the current state, so a move that
+    turned out to be blocked is simply retried differently.
+    """
+    rotation, x = target
+    if engine.rotation != rotation:
+        return tetris_engine.ROTATE
+    if engine.x < x:
+        return tetris_engine.RIGHT
+    if engine.x > x:
+        return tetris_engine.LEFT
+    return tetris_engine.DOWN
+
+
+class AutoPlayer:
+    """
+    Plays through the normal input path: call update() every game loop
+    iteration; it returns an action to press, or None. The search for a new
+    piece runs in slices of at most budget seconds per call, and moves are
+    spaced move_interval seconds apart so they can be followed on the panel.
+    """
+
+    def __init__(self, engine, budget=0.002, move_interval=0.12, lookahead=True, weights=WEIGHTS):
+        self.engine = engine
+        self.budget = budget
+        self.move_interval = move_interval
+        self.lookahead = lookahead
+        self.weights = weights
+        self.target = None
+        self.searches = 0
+        self.search_time = 0.0
+        self._piece = None
+        self._search = None
+        self._next_move = 0.0
+
+    def update(self, now):
+        engine = self.engine
+        if engine.game_over:
+            self._piece = None
+            return None
+        if self._piece != engine.pieces:
+            # a new piece: start searching
+            self._piece = engine.pieces
+            self.target = None
+            self._search = search(tuple(engine.rows), engine.width, engine.shape, engine.y,
+                                  engine.next_shape if self.lookahead else None, self.weights)
+            self.searches += 1
+        if self._search is not None:
+            started = perf_counter()
+            deadline = started + self.budget
+            for result in self._search:
+                if result is not None:
+                    self.target = result[1:]
+                    self._search = None
+                    break
+                if perf_counter() >= deadline:
+                    break
+            else:
+                self._search = None  # nothing fits
+            self.search_time += perf_counter() - started
+            if self.target is None:
+                return None
+        if self.target is None or now < self._next_move:
+            return None
+        self._next_move = now + self.move_interval
+        return next_move(engine, self.target)
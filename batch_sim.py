@@ -0,0 +1,197 @@
+"""
+Play many seeded Tetris games headlessly across a process pool.
+
+Per-game stats are streamed into a compact columnar file: a small JSON
+header followed by row groups, each holding one little-endian uint32
+array per column. Game i of a run with seed S always plays the same way,
+whatever the number of workers.
+
+    python batch_sim.py --games 10000 --seed 1 --out results.tsim
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import struct
+import sys
+from array import array
+from time import perf_counter
+
+import autoplay
+import tetris_engine
+from tetris_engine import TetrisEngine
+
+MAGIC = b"TSIM"
+VERSION = 1
+COLUMNS = ("game", "score", "lines", "pieces", "ticks", "moves")
+
+RANDOM_ACTIONS = (tetris_engine.NONE, tetris_engine.LEFT, tetris_engine.RIGHT, tetris_engine.ROTATE,
+                  tetris_engine.DOWN)
+
+
+def random_policy(engine, rng):
+    """
+    One random input per gravity tick.
+    """
+    return (rng.choice(RANDOM_ACTIONS),)
+
+
+def bot_policy(engine, rng):
+    """
+    The attract-mode bot: move the piece to the best placement and drop it,
+    all within one gravity tick.
+    """
+    target = autoplay.best_placement(engine)
+    if target is None:
+        return
+    state = None
+    while (engine.rotation, engine.x) != state:
+        state = engine.rotation, engine.x
+        action = autoplay.next_move(engine, target)
+        if action == tetris_engine.DOWN:
+            break
+        yield action
+    while not engine.collides(engine.piece, engine.x, engine.y + 1):
+        yield tetris_engine.DOWN
+
+
+POLICIES = {
+    "random": random_policy,
+    "bot": bot_policy,
+}
+
+
+def game_seed(seed, game):
+    """
+    Seed for one game of a run; independent of how games are split up.
+    """
+    return f"{seed}:{game}"
+
+
+def play_game(seed, game, policy=random_policy, max_ticks=100000):
+    """
+    Play one game to game over (or max_ticks). Returns a tuple in COLUMNS order.
+    """
+    engine = TetrisEngine(seed=game_seed(seed, game))
+    rng = random.Random(game_seed(seed, game) + ":policy")
+    ticks = 0
+    while not engine.game_over and ticks < max_ticks:
+        for action in policy(engine, rng):
+            engine.step(action)
+        engine.step(tetris_engine.GRAVITY)
+        ticks += 1
+    return game, engine.score, engine.lines, engine.pieces, ticks, engine.moves
+
+
+def play_chunk(job):
+    """
+    Play games [start, stop) and return their stats as one array per column.
+    """
+    seed, start, stop, policy_name, max_ticks = job
+    policy = POLICIES[policy_name]
+    columns = [array("I") for _ in COLUMNS]
+    for game in range(start, stop):
+        for column, value in zip(columns, play_game(seed, game, policy, max_ticks)):
+            column.append(value)
+    return columns
+
+
+class ResultWriter:
+    """
+    Writes row groups of columnar results.
+    """
+
+    def __init__(self, path, meta):
+        self._file = open(path, "wb")
+        header = json.dumps(dict(meta, columns=COLUMNS)).encode()
+        self._file.write(MAGIC + struct.pack("<HI", VERSION, len(header)) + header)
+
+    def write(self, columns):
+        self._file.write(struct.pack("<I", len(columns[0])))
+        for column in columns:
+            if sys.byteorder != "little":
+                column = array(column.typecode, column)
+                column.byteswap()
+            self._file.write(column.tobytes())
+
+    def close(self):
+        self._file.close()
+
+
+def read_results(path):
+    """
+    Read a result file back. Returns (meta, {column: array}).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"{path} is not a batch result file")
+    version, header_size = struct.unpack_from("<HI", data, 4)
+    if version != VERSION:
+        raise ValueError(f"Unsupported result file version {version}")
+    offset = 10
+    meta = json.loads(data[offset:offset + header_size])
+    offset += header_size
+    columns = {name: array("I") for name in meta["columns"]}
+    while offset < len(data):
+        (rows,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        for name in meta["columns"]:
+            columns[name].frombytes(data[offset:offset + rows * 4])
+            offset += rows * 4
+    if sys.byteorder != "little":
+        for column in columns.values():
+            column.byteswap()
+    return meta, columns
+
+
+def run_batch(games, seed=0, out_path="results.tsim", workers=None, policy="random", max_ticks=100000,
+              chunk_size=64):
+    """
+    Play games across a process pool and stream stats to out_path.
+    Returns a summary dict with throughput figures.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    jobs = [(seed, start, min(start + chunk_size, games), policy, max_ticks) for start in range(0, games, chunk_size)]
+    meta = {"games": games, "seed": seed, "policy": policy, "max_ticks": max_ticks}
+
+    writer = ResultWriter(out_path, meta)
+    played = moves = score = 0
+    started = perf_counter()
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            # imap keeps chunk order, so the file is identical for any worker count
+            for columns in pool.imap(play_chunk, jobs):
+                writer.write(columns)
+                played += len(columns[0])
+                moves += sum(columns[COLUMNS.index("moves")])
+                score += sum(columns[COLUMNS.index("score")])
+    finally:
+        writer.close()
+    elapsed = perf_counter() - started
+
+    return {
+        "games": played,
+        "workers": workers,
+        "seconds": elapsed,
+        "games_per_sec": played / elapsed,
+        "moves_per_sec": moves / elapsed,
+        "mean_score": score / played if played else 0.0,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Headless batch Tetris simulation")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--max-ticks", type=int, default=100000, help="stop a game after this many gravity ticks")
+    parser.add_argument("--out", default="results.tsim")
+    cli_args = parser.parse_args()
+
+    summary = run_batch(cli_args.games, cli_args.seed, cli_args.out, cli_args.workers, cli_args.policy,
+                        cli_args.max_ticks)
+    print(f"{summary['games']} games on {summary['workers']} workers in {summary['seconds']:.2f}s: "
+          f"{summary['games_per_sec']:.1f} games/s, {summary['moves_per_sec']:.0f} moves/s, "
+          f"mean score {summary['mean_score']:.1f}")
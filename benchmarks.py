@@ -0,0 +1,402 @@
+"""
+Offline benchmarks for the latency-sensitive paths, using a fake socket or,
+for the device/ cases, the in-process emulator as the sink.
+
+    python benchmarks.py run --out baseline.json
+    python benchmarks.py run --out current.json
+    python benchmarks.py compare baseline.json current.json --threshold 0.1
+
+Each benchmark reports ops/sec, p50/p99 latency and the peak memory
+(tracemalloc) of a single operation. compare exits non-zero if any
+benchmark got slower than the threshold allows.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tracemalloc
+from time import perf_counter, perf_counter_ns, sleep, strftime
+
+import numpy as np
+from PIL import Image
+
+import encoder
+import frame_builder
+import tetris_engine
+from client import Pixoo
+from device_profile import PIXOO_32, PIXOO_64
+from pixoo_emulator import PixooEmulator
+from tetris_engine import TetrisEngine
+from tetris_render import BoardRenderer
+
+BENCHMARKS = {}
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def fixture(name):
+    """
+    Path of one of the repository's images, wherever the benchmarks run from.
+    """
+    return os.path.join(HERE, name)
+
+
+def benchmark(name):
+    """
+    Register a benchmark. The decorated function does the setup and returns
+    the zero-argument callable to time.
+    """
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+def offline_pixoo(profile=None):
+    """
+    Pixoo without caching, writing to a socket that discards everything.
+    """
+    pixoo = Pixoo("offline", cache=False, profile=profile)
+    pixoo.btsock = frame_builder.NullSocket()
+    return pixoo
+
+
+def emulated_pixoo(profile=None):
+    """
+    Pixoo without caching, connected to an in-process emulator. Returns
+    (pixoo, emulated device).
+    """
+    emulator = PixooEmulator(("127.0.0.1", 0), profile=profile).start()
+    pixoo = Pixoo(emulator.url(), cache=False, profile=profile)
+    pixoo.btsock = pixoo.transport.open(5.0)
+    return pixoo, emulator.device
+
+
+def until(condition, timeout=5.0):
+    """
+    Wait for the emulator to catch up.
+    """
+    deadline = perf_counter() + timeout
+    while not condition():
+        if perf_counter() > deadline:
+            raise TimeoutError("The emulator did not show the frame")
+        sleep(0)
+
+
+class LinkSocket:
+    """
+    Socket stand-in that takes as long to write as a link of the given
+    bandwidth (bytes per second), like a blocking RFCOMM socket.
+    """
+
+    def __init__(self, bandwidth=20000):
+        self.bandwidth = bandwidth
+
+    def sendall(self, data):
+        sleep(len(data) / self.bandwidth)
+
+
+def worst_case_image(size=16):
+    """
+    A square RGB image with as many distinct colours as the encoder accepts.
+    """
+    rng = np.random.default_rng(0)
+    colors = rng.integers(0, 256, size=(256, 3), dtype=np.uint8)
+    indices = np.arange(size * size) % 256
+    return Image.fromarray(colors[indices].reshape(size, size, 3), "RGB")
+
+
+@benchmark("encode/tetris.png")
+def bench_encode_tetris():
+    pixoo = offline_pixoo()
+    img = Image.open(fixture("tetris.png")).convert("RGB")
+    return lambda: pixoo.encode_raw_image(img)
+
+
+@benchmark("encode/image.png")
+def bench_encode_image():
+    pixoo = offline_pixoo()
+    img = Image.open(fixture("image.png")).convert("RGB")
+    return lambda: pixoo.encode_raw_image(img)
+
+
+@benchmark("encode/256-colours")
+def bench_encode_worst():
+    pixoo = offline_pixoo()
+    img = worst_case_image()
+    return lambda: pixoo.encode_raw_image(img)
+
+
+@benchmark("encode/256-colours-reference")
+def bench_encode_worst_reference():
+    pixoo = offline_pixoo()
+    img = worst_case_image()
+    return lambda: pixoo.encode_raw_image_reference(img)
+
+
+@benchmark("encode/256-colours-quantized-16")
+def bench_encode_quantized():
+    pixels = np.asarray(worst_case_image())
+    quantizer = encoder.Quantizer(max_colors=16, tolerance=0)  # rebuild the palette every time
+    return lambda: quantizer.encode_pixels(pixels)
+
+
+@benchmark("encode/256-colours-quantized-reuse")
+def bench_encode_quantized_reuse():
+    pixels = np.asarray(worst_case_image())
+    quantizer = encoder.Quantizer(max_colors=16, tolerance=255)
+    return lambda: quantizer.encode_pixels(pixels)
+
+
+@benchmark("frame/picture-256-colours")
+def bench_frame_picture():
+    builder = frame_builder.FrameBuilder()
+    nb_colors, palette, pixel_data = offline_pixoo().encode_raw_image(worst_case_image())
+    return lambda: builder.picture(nb_colors, palette, pixel_data)
+
+
+def resolution_benchmarks(profile):
+    """
+    Register the frame encode and game frame benchmarks for one panel size.
+    """
+    size = f"{profile.width}x{profile.height}"
+
+    @benchmark(f"encode/{size}-256-colours")
+    def bench_encode_resolution():
+        pixoo = offline_pixoo(profile)
+        img = worst_case_image(profile.width)
+        return lambda: pixoo.encode_raw_image(img)
+
+    @benchmark(f"encode/{size}-256-colours-reference")
+    def bench_encode_resolution_reference():
+        pixoo = offline_pixoo(profile)
+        img = worst_case_image(profile.width)
+        return lambda: pixoo.encode_raw_image_reference(img)
+
+    @benchmark(f"game/{size}-tick-render-encode")
+    def bench_game_resolution():
+        engine = TetrisEngine(seed=0)
+        renderer = BoardRenderer(engine.width, engine.height, scale=profile.width // engine.width)
+        pixoo = offline_pixoo(profile)
+
+        def tick():
+            if engine.game_over:
+                engine.reset()
+            engine.step(tetris_engine.GRAVITY)
+            renderer.render(engine)
+            pixoo.draw_rgb(renderer.buffer)
+        return tick
+
+
+# 16x16 is covered by encode/256-colours(-reference) and game/tick-render-encode
+for _profile in (PIXOO_32, PIXOO_64):
+    resolution_benchmarks(_profile)
+
+
+@benchmark("draw/pic-tetris.png")
+def bench_draw_pic():
+    pixoo = offline_pixoo()
+    return lambda: pixoo.draw_pic(fixture("tetris.png"))
+
+
+@benchmark("draw/rgb-256-colours")
+def bench_draw_rgb():
+    pixoo = offline_pixoo()
+    rgb = worst_case_image().tobytes()
+    return lambda: pixoo.draw_rgb(rgb)
+
+
+@benchmark("draw/gif-scrolling_text.gif")
+def bench_draw_gif():
+    pixoo = offline_pixoo()
+    return lambda: pixoo.draw_gif(fixture("scrolling_text.gif"), 100)
+
+
+@benchmark("draw/gif-scrolling_text.gif-cached")
+def bench_draw_gif_cached():
+    pixoo = Pixoo("offline")
+    pixoo.btsock = frame_builder.NullSocket()
+    return lambda: pixoo.draw_gif(fixture("scrolling_text.gif"), 100)
+
+
+@benchmark("draw/gif-scrolling_text.gif-20kBps")
+def bench_draw_gif_link():
+    # the upload can take no less than the 4 kB of packets take on the link, 0.2 s
+    pixoo = offline_pixoo()
+    pixoo.btsock = LinkSocket(20000)
+    return lambda: pixoo.draw_gif(fixture("scrolling_text.gif"), 100)
+
+
+@benchmark("device/pic-tetris.png")
+def bench_device_pic():
+    pixoo, device = emulated_pixoo()
+
+    def op():
+        shown = device.pictures
+        pixoo.draw_pic(fixture("tetris.png"))
+        until(lambda: device.pictures > shown)
+    return op
+
+
+@benchmark("device/rgb-256-colours")
+def bench_device_rgb():
+    pixoo, device = emulated_pixoo()
+    rgb = worst_case_image().tobytes()
+
+    def op():
+        shown = device.pictures
+        pixoo.draw_rgb(rgb)
+        until(lambda: device.pictures > shown)
+    return op
+
+
+@benchmark("device/gif-scrolling_text.gif")
+def bench_device_gif():
+    pixoo, device = emulated_pixoo()
+
+    def op():
+        shown = device.animations
+        pixoo.draw_gif(fixture("scrolling_text.gif"), 100)
+        until(lambda: device.animations > shown)
+    return op
+
+
+@benchmark("anim/chunk-32-frames")
+def bench_anim_chunks():
+    pixoo = offline_pixoo()
+    data = bytearray()
+    nb_colors, palette, pixel_data = pixoo.encode_raw_image(worst_case_image())
+    for n in range(32):
+        frame_builder.append_anim_frame(data, nb_colors, palette, pixel_data, 100)
+    return lambda: frame_builder.anim_packets(data)
+
+
+@benchmark("text/draw-50-chars")
+def bench_draw_text():
+    pixoo = offline_pixoo()
+    text = "This is a longer gif test to see if time is a problem"[:50]
+    return lambda: pixoo.draw_text(text, 12, 100, (0, 0, 255), (0, 0, 0))
+
+
+@benchmark("game/tick-render")
+def bench_game_tick():
+    engine = TetrisEngine(seed=0)
+    renderer = BoardRenderer(engine.width, engine.height)
+
+    def tick():
+        if engine.game_over:
+            engine.reset()
+        engine.step(tetris_engine.GRAVITY)
+        renderer.render(engine)
+    return tick
+
+
+@benchmark("game/tick-render-encode")
+def bench_game_tick_encode():
+    engine = TetrisEngine(seed=0)
+    renderer = BoardRenderer(engine.width, engine.height)
+    pixoo = offline_pixoo()
+
+    def tick():
+        if engine.game_over:
+            engine.reset()
+        engine.step(tetris_engine.GRAVITY)
+        renderer.render(engine)
+        pixoo.draw_rgb(renderer.buffer)
+    return tick
+
+
+def run_one(factory, min_time=0.5, max_ops=100000):
+    """
+    Time a benchmark. Returns its result dict.
+    """
+    op = factory()
+    op()  # warm up caches and lazy imports
+    timings = []
+    started = perf_counter()
+    while len(timings) < max_ops and (perf_counter() - started < min_time or len(timings) < 5):
+        t0 = perf_counter_ns()
+        op()
+        timings.append(perf_counter_ns() - t0)
+    timings.sort()
+
+    # memory is measured separately, tracemalloc would skew the timings
+    tracemalloc.start()
+    op()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    total = sum(timings)
+    return {
+        "ops": len(timings),
+        "ops_per_sec": len(timings) / (total / 1e9) if total else float("inf"),
+        "p50_us": timings[len(timings) // 2] / 1000,
+        "p99_us": timings[min(len(timings) - 1, len(timings) * 99 // 100)] / 1000,
+        "peak_kb": peak / 1024,
+    }
+
+
+def run(names=None, min_time=0.5):
+    results = {}
+    for name, factory in BENCHMARKS.items():
+        if names and not any(part in name for part in names):
+            continue
+        results[name] = result = run_one(factory, min_time)
+        print(f"{name:36} {result['ops_per_sec']:12.1f} ops/s  p50 {result['p50_us']:10.1f} us  "
+              f"p99 {result['p99_us']:10.1f} us  peak {result['peak_kb']:8.1f} KB")
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "date": strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    List benchmarks whose throughput dropped or whose p99 latency grew by
+    more than threshold (a fraction). Returns the regressions.
+    """
+    regressions = []
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:36} new")
+            continue
+        speed = new["ops_per_sec"] / old["ops_per_sec"] - 1
+        tail = new["p99_us"] / old["p99_us"] - 1 if old["p99_us"] else 0.0
+        flag = speed < -threshold or tail > threshold
+        if flag:
+            regressions.append(name)
+        print(f"{name:36} ops/s {speed:+7.1%}  p99 {tail:+7.1%}{'  REGRESSION' if flag else ''}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pixoo pipeline benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--out", help="write results to this JSON file")
+    run_parser.add_argument("--min-time", type=float, default=0.5, help="seconds per benchmark")
+    run_parser.add_argument("filters", nargs="*", help="only run benchmarks whose name contains one of these")
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown (0.1 = 10%%)")
+    cli_args = parser.parse_args()
+
+    if cli_args.command == "run":
+        output = run(cli_args.filters, cli_args.min_time)
+        if cli_args.out:
+            with open(cli_args.out, "w") as f:
+                json.dump(output, f, indent=2)
+    else:
+        with open(cli_args.baseline) as f:
+            baseline_results = json.load(f)
+        with open(cli_args.current) as f:
+            current_results = json.load(f)
+        if compare(baseline_results, current_results, cli_args.threshold):
+            sys.exit(1)
@@ -1,12 +1,22 @@
-import math
+import io
 import os
+import threading
 
 import keyboard
-from PIL import Image, ImageDraw, ImageFont
-import imageio
-import socket
+from PIL import Image
+import numpy as np
 from math import log10, ceil
-from time import sleep
+from time import perf_counter, sleep
+
+import encoder
+import frame_builder
+import frame_trace
+import send_queue
+import text_render
+from connection import ConnectionManager
+from device_profile import get_profile
+from frame_cache import FrameCache
+from transport import transport_from_address
 
 
 class Pixoo:
@@ -19,19 +29,42 @@ class Pixoo:
     BOX_MODE_COLOR = 2
     BOX_MODE_SPECIAL = 3
 
+    BDADDR = "11:75:58:81:e8:b6"  # default device for get()
     instance = None
 
-    def __init__(self, mac_address):
+    def __init__(self, mac_address, cache=None, transport=None, connection=None, profile=None):
         """
-        Constructor
+        Constructor. Encoded packets are kept in cache (a FrameCache, one is
+        created by default); pass cache=False to disable caching.
+        mac_address may also be "tcp://host:port" or "unix:///path" to talk to
+        an emulator, or pass a Transport explicitly. connection is a
+        ConnectionManager to tune timeouts, backoff and the outage policy, or
+        False for a Pixoo without a link of its own (see DeviceGroup).
+        profile is the panel's DeviceProfile (or its name), 16x16 by default.
         """
         self.mac_address = mac_address
-        self.btsock = None
+        self.profile = get_profile(profile)
+        # frames with more colours than the panel takes are quantized
+        self.quantizer = encoder.Quantizer(self.profile.max_colors) if self.profile.max_colors < 256 else None
+        if connection is False:
+            self.transport = self.connection = None
+        else:
+            self.transport = transport if transport is not None else transport_from_address(mac_address)
+            self.connection = connection if connection is not None else ConnectionManager(self.transport)
+        if cache is None:
+            cache = FrameCache()
+        self.cache = cache if cache is not False else None
+        self.send_queue = None
+        self.text_stats = None
+        self._local = threading.local()
 
     @staticmethod
-    def get():
+    def get(mac_address=None):
+        """
+        Shared, connected instance for mac_address (Pixoo.BDADDR by default).
+        """
         if Pixoo.instance is None:
-            Pixoo.instance = Pixoo(Pixoo.BDADDR)
+            Pixoo.instance = Pixoo(mac_address or Pixoo.BDADDR)
             Pixoo.instance.connect()
         return Pixoo.instance
 
@@ -46,91 +79,106 @@ class Pixoo:
             self.draw_pic(os.path.join(directory, filepath))
             sleep(delay / 1000)  # Convert milliseconds to seconds
 
-    def connect(self):
+    @property
+    def builder(self):
         """
-        Connect to SPP.
+        This thread's FrameBuilder: draw calls may come from several threads
+        and each builds into its own scratch buffer.
         """
-        while True:
-            try:
-                print(f"Connecting to {self.mac_address}...")
-                self.btsock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
-                self.btsock.connect((self.mac_address, 1))
-                sleep(1)  # mandatory to wait at least 1 second
-                print("Connected.")
-                break  # Connection successful, exit the loop
-            except OSError as e:
-                print(f"Connection failed: {e}")
-                print("Retrying in 1 second...")
-                sleep(1)  # Wait for 5 seconds before retrying
+        builder = getattr(self._local, "builder", None)
+        if builder is None:
+            builder = self._local.builder = frame_builder.FrameBuilder()
+        return builder
 
-    def __spp_frame_checksum(self, args):
+    @property
+    def btsock(self):
+        return self.connection.sock
+
+    @btsock.setter
+    def btsock(self, sock):
+        self.connection.attach(sock)
+
+    def connect(self, max_attempts=None):
         """
-        Compute frame checksum
+        Connect to SPP, retrying with backoff (forever unless max_attempts is
+        given). Returns True once connected.
         """
-        return sum(args[1:]) & 0xFFFF
+        print(f"Connecting to {self.transport}...")
+        return self.connection.connect(max_attempts)
 
-    def __spp_frame_encode(self, cmd, args):
+    def start_background(self, maxsize=8):
         """
-        Encode frame for given command and arguments (list).
+        Hand all sends to a background worker thread. Draw and control calls
+        then return immediately with a Future instead of blocking on the socket.
         """
-        payload_size = len(args) + 3
-
-        # create our header
-        frame_header = [1, payload_size & 0xFF, (payload_size >> 8) & 0xFF, cmd]
-
-        # concatenate our args (byte array)
-        frame_buffer = frame_header + args
-
-        # compute checksum (first byte excluded)
-        cs = self.__spp_frame_checksum(frame_buffer)
+        if self.send_queue is None:
+            self.send_queue = send_queue.SendQueue(self, maxsize).start()
+        return self.send_queue
 
-        # create our suffix (including checksum)
-        frame_suffix = [cs & 0xFF, (cs >> 8) & 0xFF, 2]
-
-        # return output buffer
-        return frame_buffer + frame_suffix
+    def stop_background(self, drain=True):
+        """
+        Stop the background worker and go back to blocking sends.
+        """
+        if self.send_queue is not None:
+            self.send_queue.stop(drain)
+            self.send_queue = None
 
-    def send(self, cmd, args, retry_count=math.inf):
+    def send(self, cmd, args, retry_count=None):
         """
         Send data to SPP. Try to reconnect if the socket got closed.
         """
-        spp_frame = self.__spp_frame_encode(cmd, args)
-        self.__send_with_retry_reconnect(bytes(spp_frame), retry_count)
+        spp_frame = self.builder.command(cmd, bytes(args))
+        if self.send_queue is not None:
+            return self.send_queue.submit([bytes(spp_frame)], send_queue.CONTROL)
+        return self.send_packets([spp_frame], retry_count, send_queue.CONTROL)
 
-    def __send_with_retry_reconnect(self, bytes_to_send, retry_count=5):
+    def __dispatch(self, packets, kind):
         """
-        Send data with a retry in case of socket errors.
+        Send packets now, or queue them when a background worker is running.
         """
-        while retry_count >= 0:
-            try:
-                if self.btsock is not None:
-                    self.btsock.send(bytes_to_send)
-                    return
-
-                print(f"[!] Socket is closed. Reconnecting... ({retry_count} tries left)")
-                retry_count -= 1
-                self.connect()
-            except (ConnectionResetError, OSError):  # OSError is for Device is Offline
-                self.btsock = None  # reset the btsock
-                print("[!] Connection was reset. Retrying...")
+        tracer = frame_trace.tracer
+        frame_id = None
+        if tracer is not None:
+            frame_id = tracer.current
+            tracer.mark("build", frame_id)
+        if self.send_queue is not None:
+            # the builder's scratch buffer is reused by the next frame
+            scratch = self.builder.scratch
+            packets = [bytes(p) if isinstance(p, memoryview) and p.obj is scratch else p for p in packets]
+            # the worker stamps send_start and send_end around the write
+            return self.send_queue.submit(packets, kind, frame_id)
+        if frame_id is not None:
+            tracer.mark("send_start", frame_id)
+        sent = self.send_packets(packets, kind=kind)
+        if frame_id is not None:
+            tracer.mark("send_end", frame_id)
+        return sent
+
+    def send_packets(self, packets, retry_count=None, kind=None):
+        """
+        Send already encoded SPP packets, reconnecting at most retry_count
+        times. Returns False if the device could not be reached; the packets
+        are then dropped or held according to the connection's outage policy.
+        """
+        return self.connection.send(packets, kind, retry_count)
 
     def set_system_brightness(self, brightness):
         """
         Set system brightness.
         """
-        self.send(Pixoo.CMD_SET_SYSTEM_BRIGHTNESS, [brightness & 0xFF])
+        return self.send(Pixoo.CMD_SET_SYSTEM_BRIGHTNESS, [brightness & 0xFF])
 
     def set_box_mode(self, boxmode, visual=0, mode=0):
         """
         Set box mode.
         """
-        self.send(0x45, [boxmode & 0xFF, visual & 0xFF, mode & 0xFF])
+        return self.send(0x45, [boxmode & 0xFF, visual & 0xFF, mode & 0xFF])
 
     def set_color(self, r, g, b):
         """
         Set color.
         """
-        self.send(0x6F, [r & 0xFF, g & 0xFF, b & 0xFF])
+        return self.send(0x6F, [r & 0xFF, g & 0xFF, b & 0xFF])
 
     def encode_image(self, filepath):
         img = Image.open(filepath)
@@ -138,20 +186,40 @@ class Pixoo:
 
     def encode_raw_image(self, img):
         """
-        Encode a 16x16 image.
+        Encode a square image, scaled to the profile's resolution. Returns
+        (nb_colors, palette bytes, pixel bytes).
+        """
+        w, h = img.size
+        if w == h:
+            return self.__encode_pixels(np.asarray(self.profile.fit(img.convert("RGB"))))
+        else:
+            print("[!] Image must be square.")
+
+    def encode_rgb(self, rgb):
+        """
+        Encode a raw RGB buffer at the profile's resolution.
+        """
+        return self.__encode_pixels(np.frombuffer(rgb, dtype=np.uint8))
+
+    def __encode_pixels(self, pixels):
+        if self.quantizer is not None:
+            return self.quantizer.encode_pixels(pixels)
+        return encoder.encode_pixels(pixels)
+
+    def encode_raw_image_reference(self, img):
+        """
+        Encode a square image, one pixel at a time.
+        Reference implementation for the vectorized encode_raw_image.
         """
-        # ensure image is 16x16
         w, h = img.size
         if w == h:
-            # resize if image is too big
-            if w > 16:
-                img = img.resize((16, 16))
+            img = self.profile.fit(img)
 
             # create palette and pixel array
             pixels = []
             palette = []
-            for y in range(16):
-                for x in range(16):
+            for y in range(img.height):
+                for x in range(img.width):
                     pix = img.getpixel((x, y))
 
                     if len(pix) == 4:
@@ -167,7 +235,7 @@ class Pixoo:
 
             # encode pixels
             bitwidth = ceil(log10(len(palette)) / log10(2))
-            nbytes = ceil((256 * bitwidth) / 8.0)
+            nbytes = ceil((len(pixels) * bitwidth) / 8.0)
             encoded_pixels = [0] * nbytes
 
             encoded_pixels = []
@@ -189,105 +257,183 @@ class Pixoo:
         """
         Parse Gif file and draw as animation.
         """
-        # encode frames
-        frames = []
-        timecode = 0
-        anim_gif = Image.open(filepath)
-        for n in range(anim_gif.n_frames):
-            anim_gif.seek(n)
-            nb_colors, palette, pixel_data = self.encode_raw_image(anim_gif.convert(mode="RGB"))
-            frame_size = 7 + len(pixel_data) + len(palette)
-            frame_header = [
-                0xAA,
-                frame_size & 0xFF,
-                (frame_size >> 8) & 0xFF,
-                timecode & 0xFF,
-                (timecode >> 8) & 0xFF,
-                0,
-                nb_colors,
-            ]
-            frame = frame_header + palette + pixel_data
-            frames += frame
-            timecode = speed
-
-        # send animation
-        nchunks = ceil(len(frames) / 200.0)
-        total_size = len(frames)
-        for i in range(nchunks):
-            chunk = [total_size & 0xFF, (total_size >> 8) & 0xFF, i]
-            self.send(0x49, chunk + frames[i * 200: (i + 1) * 200])
+        return self.draw_packets(self.gif_packets(filepath, speed))
 
     def draw_anim(self, directory, speed=100):
-        timecode = 0
+        """
+        Draw the frame_*.png files of a directory as animation.
+        """
+        return self.draw_packets(self.anim_packets(directory, speed))
+
+    def draw_packets(self, packets, kind=send_queue.ANIM):
+        """
+        Send packets built earlier by gif_packets/anim_packets (or loaded from
+        an animation library).
+        """
+        return self.__dispatch(packets, kind)
+
+    def gif_packets(self, filepath, speed):
+        """
+        Encode a Gif file into ready-to-send 0x49 packets.
+        """
+        with open(filepath, "rb") as f:
+            data = f.read()
+
+        def build():
+            # encode frames
+            frames = bytearray()
+            timecode = 0
+            anim_gif = Image.open(io.BytesIO(data))
+            for n in range(anim_gif.n_frames):
+                anim_gif.seek(n)
+                self.__anim_frame(frames, self.encode_raw_image(anim_gif.convert(mode="RGB")), timecode)
+                timecode = speed
+            return self.__anim_packets(frames)
+
+        return self.__cached(FrameCache.make_key("gif", data, speed), build)
+
+    def anim_packets(self, directory, speed=100):
+        """
+        Encode the frame_*.png files of a directory into ready-to-send 0x49 packets.
+        """
+        file_data = self.__anim_files(directory)
+
+        def build():
+            # encode frames
+            frames = bytearray()
+            timecode = 0
+            for data in file_data:
+                self.__anim_frame(frames, self.encode_raw_image(Image.open(io.BytesIO(data))), timecode)
+                timecode += speed
+            return self.__anim_packets(frames)
 
+        return self.__cached(self.__anim_key(file_data, speed), build)
+
+    @staticmethod
+    def __anim_files(directory):
+        """
+        Contents of the frame_*.png files of a directory, in frame order.
+        """
         # Get a list of image files in the directory
         image_files = sorted([f for f in os.listdir(directory) if f.startswith("frame_") and f.endswith(".png")])
-
-        # encode frames
-        frames = []
-        n = 0
+        file_data = []
         for filepath in image_files:
-            nb_colors, palette, pixel_data = self.encode_image(os.path.join(directory, filepath))
-            frame_size = 7 + len(pixel_data) + len(palette)
-            frame_header = [
-                0xAA,
-                frame_size & 0xFF,
-                (frame_size >> 8) & 0xFF,
-                timecode & 0xFF,
-                (timecode >> 8) & 0xFF,
-                0,
-                nb_colors,
-            ]
-            frame = frame_header + palette + pixel_data
-            frames += frame
-            timecode += speed
-
-        # send animation
-        nchunks = ceil(len(frames) / 200.0)
-        total_size = len(frames)
-        for i in range(nchunks):
-            chunk = [total_size & 0xFF, (total_size >> 8) & 0xFF, i]
-            self.send(0x49, chunk + frames[i * 200: (i + 1) * 200])
+            with open(os.path.join(directory, filepath), "rb") as f:
+                file_data.append(f.read())
+        return file_data
+
+    @staticmethod
+    def __anim_key(file_data, speed):
+        content = b"".join(len(data).to_bytes(4, "little") + data for data in file_data)
+        return FrameCache.make_key("anim", content, speed)
 
     def draw_pic(self, filepath):
         """
         Draw encoded picture.
         """
-        nb_colors, palette, pixel_data = self.encode_image(filepath)
-        frame_size = 7 + len(pixel_data) + len(palette)
-        frame_header = [0xAA, frame_size & 0xFF, (frame_size >> 8) & 0xFF, 0, 0, 0, nb_colors]
-        frame = frame_header + palette + pixel_data
-        prefix = [0x0, 0x0A, 0x0A, 0x04]
-        self.send(0x44, prefix + frame)
+        with open(filepath, "rb") as f:
+            data = f.read()
+        key = FrameCache.make_key("pic", data)
+        packets = self.__cached(key, lambda: self.__pic_packets(self.encode_raw_image(Image.open(io.BytesIO(data)))))
+        return self.__dispatch(packets, send_queue.FRAME)
 
-    def draw_text(self, text, font_size, delay, text_color, background_color):
-        width, height = 16, 16  # Dimensions of the display
-        font_path = "PIXELADE.TTF"
-        font = ImageFont.truetype(font_path, font_size)
-        # text_color = (0, 0, 255)
-        # background_color = (0, 0, 0)
-
-        # Generate frames for scrolling text
-        frames = []
-        for shift in range(len(text) * font_size):
-            img = Image.new("RGB", (width, height), background_color)
-            draw = ImageDraw.Draw(img)
-            text_position = (width - shift, (height - font_size) // 2)
-            draw.text(text_position, text, font=font, fill=text_color)
-            frames.append(img)
-
-        # Save GIF using imageio
-        gif_path = "scrolling_text.gif"  # Change this to the desired GIF path
-        with imageio.get_writer(gif_path, mode='I', duration=delay / 1000) as writer:
-            for frame in frames:
-                writer.append_data(frame)
-
-        # Clean up
-        for frame in frames:
-            frame.close()
+    def draw_rgb(self, rgb, size=None):
+        """
+        Draw a raw RGB buffer (size x size pixels, row-major, the profile's
+        resolution by default), as published on a frame bus.
+        """
+        size = size or self.profile.width
+
+        def build():
+            if (size, size) == self.profile.size:
+                return self.__pic_packets(self.encode_rgb(rgb))
+            img = Image.frombytes("RGB", (size, size), bytes(rgb))
+            return self.__pic_packets(self.encode_raw_image(img))
+
+        return self.__dispatch(self.__cached(FrameCache.make_key("rgb", rgb, size), build), send_queue.FRAME)
+
+    def draw_encoded(self, nb_colors, palette, pixel_data):
+        """
+        Send an encoded picture as a still frame.
+        """
+        return self.__dispatch(self.__pic_packets((nb_colors, palette, pixel_data)), send_queue.FRAME)
+
+    def __cached(self, key, build):
+        """
+        Return the packets cached under key, building and caching them on a miss.
+        """
+        if self.cache is None:
+            return build()
+        packets = self.cache.get(key)
+        if packets is None:
+            packets = build()
+            self.cache.put(key, packets)
+        return packets
+
+    def __anim_frame(self, frames, encoded, timecode):
+        """
+        Append an animation frame (header, palette and pixel data) to frames.
+        """
+        nb_colors, palette, pixel_data = encoded
+        frame_builder.append_anim_frame(frames, nb_colors, palette, pixel_data, timecode)
 
-        self.draw_gif(gif_path, delay)  # Use the existing draw_gif method to display the generated GIF
+    def __anim_packets(self, frames):
+        """
+        Split encoded animation frames into 0x49 packets of the profile's chunk size.
+        """
+        return frame_builder.anim_packets(frames, self.profile.chunk_size)
 
+    def __pic_packets(self, encoded):
+        """
+        Single 0x44 packet showing a still picture.
+        """
+        return [self.builder.picture(*encoded)]
+
+    def draw_frames(self, frames, speed=100):
+        """
+        Draw in-memory frames as an animation. frames yields raw RGB buffers
+        at the profile's resolution, or (rgb, repeat) pairs for a frame shown repeat times as long.
+        """
+        return self.__dispatch(self.__anim_packets(self.__encode_frames(frames, speed)), send_queue.ANIM)
+
+    def draw_text(self, text, font_size, delay, text_color, background_color):
+        """
+        Scroll text across the display. Time until the first packet is ready
+        to send is kept in text_stats.
+        """
+        started = perf_counter()
+        stats = {"text": text, "frames": None}
+
+        def build():
+            frames = list(text_render.scroll_frames(text, font_size, text_color, background_color,
+                                                    self.profile.width, self.profile.height))
+            stats["frames"] = len(frames)
+            return self.__anim_packets(self.__encode_frames(frames, delay))
+
+        key = FrameCache.make_key("text", text.encode(), font_size, delay, tuple(text_color), tuple(background_color))
+        packets = self.__cached(key, build)
+        stats["packets"] = len(packets)
+        stats["first_packet_latency"] = perf_counter() - started
+        self.text_stats = stats
+        return self.__dispatch(packets, send_queue.ANIM)
+
+    def __encode_frames(self, frames, speed):
+        """
+        Encode raw RGB frames into animation frame data, each timecoded with
+        how long it is shown. A repeated frame is stretched rather than sent
+        again, the first one included.
+        """
+        data = bytearray()
+        for frame in frames:
+            rgb, repeat = frame if isinstance(frame, tuple) else (frame, 1)
+            encoded = self.encode_rgb(rgb)
+            duration = speed * repeat
+            while True:
+                self.__anim_frame(data, encoded, min(duration, 0xFFFF))
+                duration -= 0xFFFF
+                if duration <= 0:
+                    break
+        return data
 
 
 if __name__ == '__main__':
@@ -298,6 +444,13 @@ if __name__ == '__main__':
     pixoo.connect()
     sleep(1)
 
+    # Precompile the GIFs so switching between them is a plain socket write
+    from anim_library import AnimLibrary, compile_library
+
+    library_path = gif_folder + ".pxal"
+    compile_library(gif_folder, library_path, speed=100, profile=pixoo.profile)
+    library = AnimLibrary(library_path, pixoo.profile)
+
     # Get a list of image files in the directory
     image_files = sorted([f for f in os.listdir(gif_folder) if f.endswith(".gif")])
 
@@ -349,6 +502,7 @@ if __name__ == '__main__':
                     pixoo.draw_text(text, font_size, delay_per_frame, text_color, background_color)
 
                     print(f"Total duration of the GIF: {gif_duration} seconds")
+                    print(f"First packet after {pixoo.text_stats['first_packet_latency'] * 1000:.1f} ms")
                     static_image_displayed = False
                     isasleep = False
                     break
@@ -360,4 +514,7 @@ if __name__ == '__main__':
             if isasleep:
                 sleep(1)
                 isasleep = False
-            pixoo.draw_gif(img_path, 100)
+            if image_files[current_gif_index] in library:
+                library.play(pixoo, image_files[current_gif_index])
+            else:
+                pixoo.draw_gif(img_path, 100)
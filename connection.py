@@ -0,0 +1,329 @@
+"""
+Connection management for the link to a Pixoo.
+
+ConnectionManager owns the socket opened by a Transport. It reconnects with
+exponential backoff and jitter, puts timeouts on connecting and sending (a
+half-open RFCOMM link otherwise blocks a send forever), can watch an idle
+link from a background thread, and reports state changes to callbacks.
+
+While the device is unreachable, sends are not queued up for a blind replay.
+Under the COLLAPSE policy only the latest picture/animation and the latest
+value of each control command are held and sent once the link is back;
+under DROP they are discarded.
+"""
+import random
+import select
+import socket
+import threading
+from time import monotonic, sleep
+
+import frame_builder
+import send_queue
+
+DISCONNECTED = "disconnected"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+BACKOFF = "backoff"  # waiting before the next connection attempt
+CLOSED = "closed"
+
+DROP = "drop"
+COLLAPSE = "collapse"
+
+
+class ConnectionManager:
+    """
+    Keeps a Transport connected. connect() blocks until connected (or out of
+    attempts), send() writes a batch of packets and reconnects a bounded
+    number of times on failure. With start_monitor(), a background thread
+    probes the idle link and does the reconnecting, so send() never blocks
+    on a dead device.
+    """
+
+    def __init__(self, transport, connect_timeout=5.0, send_timeout=2.0, backoff_base=0.5, backoff_max=30.0,
+                 jitter=0.5, send_attempts=3, probe_interval=5.0, probe_packet=None, outage_policy=COLLAPSE):
+        """
+        Backoff doubles from backoff_base up to backoff_max seconds, minus a
+        random fraction (up to jitter) of it. send_attempts bounds the
+        reconnection attempts made by a send. probe_packet, if given, is
+        written to an idle link every probe_interval seconds so a half-open
+        link runs into the send timeout; otherwise the probe only checks
+        whether the peer closed the socket.
+        """
+        if outage_policy not in (DROP, COLLAPSE):
+            raise ValueError(f"Unknown outage policy: {outage_policy}")
+        self.transport = transport
+        self.connect_timeout = connect_timeout
+        self.send_timeout = send_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.send_attempts = send_attempts
+        self.probe_interval = probe_interval
+        self.probe_packet = probe_packet
+        self.outage_policy = outage_policy
+
+        self.sock = None
+        self.state = DISCONNECTED
+        self.last_error = None
+        self._callbacks = []
+        self._held = {}
+        self._lock = threading.RLock()
+        self._held_lock = threading.Lock()  # held buffers are also collapsed without the main lock
+        self._wake = threading.Event()
+        self._monitor = None
+        self._last_activity = monotonic()
+        self._down_since = None
+
+        self.connects = 0
+        self.reconnects = 0
+        self.failed_attempts = 0
+        self.send_timeouts = 0
+        self.probes = 0
+        self.dropped = 0
+        self.collapsed = 0
+        self._downtime = 0.0
+
+    def on_state_change(self, callback):
+        """
+        Call callback(old_state, new_state) on every state change. Callbacks
+        run on the thread that changed the state and should return quickly.
+        """
+        self._callbacks.append(callback)
+
+    def _set_state(self, state):
+        old, self.state = self.state, state
+        if old != state:
+            for callback in self._callbacks:
+                callback(old, state)
+
+    def backoff(self, attempt):
+        """
+        Delay before retry number attempt (starting at 1).
+        """
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def connect(self, max_attempts=None):
+        """
+        Open the link, retrying with backoff. Gives up after max_attempts
+        failed attempts (None: keep trying until closed). Returns True once
+        connected.
+        """
+        attempt = 0
+        while True:
+            with self._lock:
+                if self.state == CONNECTED:
+                    return True
+                if self.state == CLOSED:
+                    return False
+                self._set_state(CONNECTING)
+            # opening and settling can take seconds, senders must not wait on the lock meanwhile
+            try:
+                sock = self.transport.open(self.connect_timeout)
+            except OSError as e:
+                self.failed_attempts += 1
+                self.last_error = e
+                error = e
+            else:
+                sock.settimeout(self.send_timeout)
+                sleep(self.transport.settle_time)
+                with self._lock:
+                    if self.state in (CONNECTED, CLOSED):  # closed, or connected by another thread meanwhile
+                        sock.close()
+                        return self.state == CONNECTED
+                    self.attach(sock)
+                    print(f"Connected to {self.transport}.")
+                    self._send_held()
+                    if self.state == CONNECTED:  # the held packets may have found the link dead again
+                        return True
+                    error = self.last_error
+
+            attempt += 1
+            if max_attempts is not None and attempt >= max_attempts:
+                self._set_state(DISCONNECTED)
+                print(f"[!] Could not connect to {self.transport} after {attempt} attempts: {error}")
+                return False
+            delay = self.backoff(attempt)
+            print(f"[!] Connecting to {self.transport} failed: {error}. Retrying in {delay:.1f}s")
+            self._set_state(BACKOFF)
+            self._wake.clear()
+            if self._wake.wait(delay) and self.state == CLOSED:
+                return False
+
+    def attach(self, sock):
+        """
+        Use an already connected socket.
+        """
+        with self._lock:
+            now = monotonic()
+            if self._down_since is not None:
+                self._downtime += now - self._down_since
+                self._down_since = None
+            if self.connects:
+                self.reconnects += 1
+            self.connects += 1
+            self.sock = sock
+            self._last_activity = now
+            self._set_state(CONNECTED)
+
+    def send(self, buffers, kind=None, max_attempts=None):
+        """
+        Write buffers, reconnecting (at most max_attempts times, send_attempts
+        by default) and resending the whole batch if the link fails. While
+        the monitor is running, reconnecting is left to it. Returns True once
+        written, False if the device is unreachable and the outage policy
+        applied.
+        """
+        if max_attempts is None:
+            max_attempts = self.send_attempts
+        if self._monitor is not None and self.state != CONNECTED:
+            # the monitor is reconnecting, possibly holding the lock for a while
+            return self._hold(buffers, kind)
+        with self._lock:
+            for _ in range(2):  # one resend after a reconnect
+                if self.state != CONNECTED:
+                    if self._monitor is not None or not max_attempts or not self.connect(max_attempts):
+                        break
+                if self._write(buffers):
+                    return True
+            return self._hold(buffers, kind)
+
+    def _write(self, buffers):
+        try:
+            frame_builder.sendall_vectored(self.sock, buffers)
+        except OSError as e:  # also socket.timeout and device offline
+            if isinstance(e, socket.timeout):
+                self.send_timeouts += 1
+            self._lost(e)
+            return False
+        self._last_activity = monotonic()
+        return True
+
+    def _lost(self, error):
+        """
+        Drop a broken socket and let the monitor (if any) reconnect.
+        """
+        print(f"[!] Connection to {self.transport} lost: {error}")
+        self.last_error = error
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+        if self._down_since is None:
+            self._down_since = monotonic()
+        self._set_state(DISCONNECTED)
+        self._wake.set()
+
+    def _hold(self, buffers, kind):
+        """
+        Apply the outage policy to buffers that could not be sent.
+        """
+        if self.outage_policy == DROP:
+            self.dropped += 1
+            return False
+        # a new picture or animation replaces whatever was shown before,
+        # a control command only replaces an older one of the same command
+        key = "display" if kind in (send_queue.FRAME, send_queue.ANIM) else bytes(buffers[0][3:4])
+        buffers = [bytes(buf) for buf in buffers]
+        with self._held_lock:
+            if self._held.pop(key, None) is not None:
+                self.collapsed += 1
+            self._held[key] = buffers
+        return False
+
+    def _send_held(self):
+        with self._held_lock:
+            held, self._held = self._held, {}
+        for key, buffers in list(held.items()):
+            if not self._write(buffers):
+                break
+            del held[key]
+        with self._held_lock:
+            # keep what was not sent, unless something newer was held meanwhile
+            for key, buffers in held.items():
+                self._held.setdefault(key, buffers)
+
+    def start_monitor(self):
+        """
+        Start the background thread that probes the idle link and reconnects.
+        """
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._run_monitor, name="pixoo-connection", daemon=True)
+            self._monitor.start()
+        return self
+
+    def _run_monitor(self):
+        while self.state != CLOSED:
+            if self.state != CONNECTED:
+                self.connect()
+                continue
+            self._wake.clear()
+            idle = monotonic() - self._last_activity
+            if idle >= self.probe_interval:
+                self.probe()
+                idle = 0
+            self._wake.wait(self.probe_interval - idle)
+
+    def probe(self):
+        """
+        Check an idle link. Skipped while another thread is sending.
+        """
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self.state != CONNECTED:
+                return
+            self.probes += 1
+            if self.probe_packet is not None:
+                self._write([self.probe_packet])
+                return
+            if not hasattr(self.sock, "fileno"):
+                return
+            try:
+                # the device's replies are never read otherwise, drain them
+                while select.select([self.sock], [], [], 0)[0]:
+                    if not self.sock.recv(4096):
+                        self._lost(ConnectionResetError("closed by the device"))
+                        return
+                self._last_activity = monotonic()
+            except OSError as e:
+                self._lost(e)
+        finally:
+            self._lock.release()
+
+    @property
+    def downtime(self):
+        """
+        Seconds spent disconnected since the first connection.
+        """
+        if self._down_since is None:
+            return self._downtime
+        return self._downtime + monotonic() - self._down_since
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "failed_attempts": self.failed_attempts,
+            "send_timeouts": self.send_timeouts,
+            "probes": self.probes,
+            "downtime": self.downtime,
+            "held": len(self._held),
+            "dropped": self.dropped,
+            "collapsed": self.collapsed,
+            "last_error": str(self.last_error) if self.last_error else None,
+        }
+
+    def close(self):
+        with self._lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+            self._set_state(CLOSED)
+        self._wake.set()
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
@@ -0,0 +1,97 @@
+"""
+Drive several Pixoo devices from one host.
+
+A DeviceGroup has the drawing API of a single Pixoo, but every frame is
+encoded once and the identical wire bytes are queued to each device. Every
+device has its own send queue and worker thread, and its own connection
+monitor, so a slow or unreachable device only falls behind (its stale
+frames are coalesced or dropped) without holding up the others.
+"""
+from time import monotonic, sleep
+
+import send_queue
+from client import Pixoo
+from connection import CONNECTED
+
+
+class DeviceGroup(Pixoo):
+    """
+    Fan-out to a list of devices, given as addresses or Pixoo instances.
+    Draw and control calls return one Future per device, in device order.
+    All devices must be of the same profile, as frames are encoded once.
+    """
+
+    def __init__(self, devices, cache=None, maxsize=8, profile=None):
+        self.devices = [device if isinstance(device, Pixoo) else Pixoo(device, cache=False, profile=profile)
+                        for device in devices]
+        if not self.devices:
+            raise ValueError("A device group needs at least one device")
+        # the devices have the links, the group only encodes
+        super().__init__(",".join(device.mac_address for device in self.devices), cache=cache, connection=False,
+                         profile=profile)
+        if any(device.profile is not self.profile for device in self.devices):
+            raise ValueError(f"All devices of a group must use the {self.profile.name} profile")
+        self.maxsize = maxsize
+        self._started = monotonic()
+        for device in self.devices:
+            device.start_background(maxsize)
+
+    def connect(self, timeout=10.0):
+        """
+        Start every device's connection monitor, which connects it in the
+        background and keeps it connected, and wait up to timeout seconds for
+        all of them. Returns True if every device is connected by then; the
+        others keep retrying and get frames as soon as they are up, an
+        unreachable device never holds up the rest.
+        """
+        for device in self.devices:
+            print(f"Connecting to {device.transport}...")
+            device.connection.start_monitor()
+        deadline = monotonic() + timeout
+        while not self.connected():
+            if monotonic() >= deadline:
+                offline = [device.mac_address for device in self.devices if device.connection.state != CONNECTED]
+                print(f"[!] Not connected yet: {', '.join(offline)}")
+                return False
+            sleep(0.05)
+        return True
+
+    def connected(self):
+        return all(device.connection.state == CONNECTED for device in self.devices)
+
+    def start_background(self, maxsize=8):
+        # every device already has its own background queue
+        return None
+
+    def send_packets(self, packets, retry_count=None, kind=send_queue.CONTROL):
+        """
+        Queue the same packets to every device. Returns their Futures.
+        """
+        # copied once: the builder's scratch buffer is reused by the next frame
+        packets = [bytes(packet) for packet in packets]
+        return [device.send_queue.submit(packets, kind) for device in self.devices]
+
+    def stats(self):
+        """
+        Per-device queue, throughput and connection statistics.
+        """
+        elapsed = monotonic() - self._started
+        stats = {}
+        for device in self.devices:
+            queue = device.send_queue
+            stats[device.mac_address] = {
+                "sent": queue.sent,
+                "coalesced": queue.coalesced,
+                "dropped": queue.dropped,
+                "errors": queue.errors,
+                "pending": queue.pending(),
+                "bytes_sent": queue.bytes_sent,
+                "bytes_per_sec": queue.bytes_sent / elapsed if elapsed else 0.0,
+                "connection": device.connection.stats(),
+            }
+        return stats
+
+    def close(self, drain=True):
+        for device in self.devices:
+            device.stop_background(drain)
+            device.connection.close()
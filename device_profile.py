@@ -0,0 +1,80 @@
+"""
+What differs between Pixoo panels: resolution, how many palette colours a
+frame may use, and how many animation bytes go into one 0x49 packet.
+
+The encoder, frame builder, text and game renderers and the emulator take a
+DeviceProfile instead of assuming the 16x16 backpack, which stays the
+default.
+"""
+from PIL import Image
+
+from frame_builder import CHUNK_SIZE
+
+
+class DeviceProfile:
+    """
+    A panel model. Animations are limited by the 0x49 header to 256 packets
+    of chunk_size bytes and 65535 bytes in total, whatever the resolution.
+    """
+
+    def __init__(self, name, width, height, max_colors=256, chunk_size=CHUNK_SIZE):
+        if not 1 <= max_colors <= 256:
+            raise ValueError("A frame's colour count must fit in one byte (1-256)")
+        self.name = name
+        self.width = width
+        self.height = height
+        self.max_colors = max_colors
+        self.chunk_size = chunk_size
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def pixels(self):
+        return self.width * self.height
+
+    @property
+    def frame_size(self):
+        """
+        Bytes of a raw RGB frame.
+        """
+        return self.pixels * 3
+
+    def fit(self, img):
+        """
+        Scale a PIL image to the panel resolution if it is not already.
+        Smaller images are enlarged pixel by pixel (nearest neighbour), which
+        keeps pixel art sharp and adds no colours.
+        """
+        if img.size == self.size:
+            return img
+        if img.width <= self.width and img.height <= self.height:
+            return img.resize(self.size, Image.NEAREST)
+        return img.resize(self.size)
+
+    def __repr__(self):
+        return f"DeviceProfile({self.name!r}, {self.width}x{self.height}, {self.max_colors} colours)"
+
+
+PIXOO_16 = DeviceProfile("16", 16, 16)
+PIXOO_32 = DeviceProfile("32", 32, 32)
+PIXOO_64 = DeviceProfile("64", 64, 64)
+DEFAULT_PROFILE = PIXOO_16
+
+PROFILES = {profile.name: profile for profile in (PIXOO_16, PIXOO_32, PIXOO_64)}
+
+
+def get_profile(profile=None):
+    """
+    A DeviceProfile from a profile, its name ("16", "32", "64") or None for
+    the default.
+    """
+    if profile is None:
+        return DEFAULT_PROFILE
+    if isinstance(profile, DeviceProfile):
+        return profile
+    try:
+        return PROFILES[str(profile)]
+    except KeyError:
+        raise ValueError(f"Unknown device profile {profile!r}, expected one of {', '.join(PROFILES)}") from None
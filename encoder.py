@@ -0,0 +1,180 @@
+"""
+Vectorized Pixoo image encoder.
+
+A frame is a palette of distinct colours, in order of first appearance
+(row-major), followed by one palette index per pixel packed LSB-first with
+ceil(log2(len(palette))) bits per index. The output is byte-for-byte the same
+as Pixoo.encode_raw_image_reference, the original pure-Python encoder.
+"""
+import numpy as np
+
+
+def bit_width(nb_colors):
+    """
+    Bits per palette index. A single colour still takes one bit per pixel.
+    """
+    return max((nb_colors - 1).bit_length(), 1)
+
+
+def extract_palette(pixels):
+    """
+    Split an (N, 3) uint8 array into a (n, 3) palette ordered by first
+    appearance and an (N,) array of palette indices.
+    """
+    keys = (pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) | pixels[:, 2]
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return pixels[first[order]], rank[inverse.ravel()]
+
+
+def pack_indices(indices, bitwidth):
+    """
+    Pack palette indices LSB-first, bitwidth bits each. Trailing bits that do
+    not fill a whole byte are dropped, as in the reference encoder.
+    """
+    if bitwidth == 8:
+        return indices.astype(np.uint8).tobytes()
+    bits = ((indices[:, None] >> np.arange(bitwidth)) & 1).astype(np.uint8).ravel()
+    bits = bits[:len(bits) - len(bits) % 8]
+    return np.packbits(bits, bitorder="little").tobytes()
+
+
+def encode_pixels(pixels):
+    """
+    Encode an (H, W, 3) or (N, 3) uint8 RGB array.
+    Returns (nb_colors, palette bytes, pixel bytes).
+    """
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    palette, indices = extract_palette(pixels)
+    return len(palette), palette.tobytes(), pack_indices(indices, bit_width(len(palette)))
+
+
+def encode_rgb(rgb):
+    """
+    Encode a raw row-major RGB buffer (bytes, bytearray or memoryview).
+    """
+    return encode_pixels(np.frombuffer(rgb, dtype=np.uint8))
+
+
+def encoded_size(nb_colors, nb_pixels=256):
+    """
+    Palette plus pixel bytes of a frame with nb_colors colours.
+    """
+    return 3 * nb_colors + nb_pixels * bit_width(nb_colors) // 8
+
+
+def nearest(colors, palette):
+    """
+    Index of the closest palette entry for each colour, and the squared
+    distance to it.
+    """
+    distances = ((colors[:, None, :].astype(np.int32) - palette[None, :, :]) ** 2).sum(axis=2)
+    indices = distances.argmin(axis=1)
+    return indices, distances[np.arange(len(colors)), indices]
+
+
+def median_cut(colors, counts, nb_colors):
+    """
+    Reduce distinct colours, weighted by pixel counts, to at most nb_colors
+    by median cut. Returns the (k, 3) uint8 palette.
+    """
+    def score(box):
+        # widest channel range, weighted by the pixels it covers
+        return 0 if len(box) < 2 else int(np.ptp(colors[box], axis=0).max()) * int(counts[box].sum())
+
+    boxes = [np.arange(len(colors))]
+    scores = [score(boxes[0])]
+    while len(boxes) < nb_colors:
+        best = int(np.argmax(scores))
+        if not scores[best]:
+            break
+        box = boxes.pop(best)
+        scores.pop(best)
+        channel = np.argmax(np.ptp(colors[box], axis=0))
+        box = box[np.argsort(colors[box, channel], kind="stable")]
+        weight = np.cumsum(counts[box])
+        cut = min(max(int(np.searchsorted(weight, weight[-1] / 2)) + 1, 1), len(box) - 1)
+        for half in (box[:cut], box[cut:]):
+            boxes.append(half)
+            scores.append(score(half))
+    palette = [np.average(colors[box], axis=0, weights=counts[box]) for box in boxes]
+    return np.rint(palette).astype(np.uint8)
+
+
+class Quantizer:
+    """
+    Lossy encoder keeping frames within a colour and/or byte budget.
+
+    Frames that fit the budget are encoded exactly. Otherwise the last
+    quantized palette is reused as long as every colour of the frame stays
+    within tolerance of it (so consecutive frames keep the same colours and
+    bit width), and a new palette is built by median cut when it does not.
+    """
+
+    def __init__(self, max_colors=None, max_bytes=None, tolerance=16):
+        """
+        max_bytes bounds palette plus pixel bytes per frame; tolerance is the
+        largest RGB distance accepted when reusing the previous palette.
+        """
+        self.max_colors = max_colors
+        self.max_bytes = max_bytes
+        self.tolerance = tolerance
+        self.palette = None
+
+        self.frames = 0
+        self.bytes = 0
+        self.exact = 0
+        self.reused = 0
+        self.rebuilt = 0
+
+    def color_budget(self, nb_pixels):
+        budget = 256 if self.max_colors is None else max(min(self.max_colors, 256), 1)
+        if self.max_bytes is not None:
+            while budget > 1 and encoded_size(budget, nb_pixels) > self.max_bytes:
+                budget -= 1
+        return budget
+
+    def encode_pixels(self, pixels):
+        """
+        Encode an (H, W, 3) or (N, 3) uint8 RGB array within the budget.
+        Returns (nb_colors, palette bytes, pixel bytes).
+        """
+        pixels = np.ascontiguousarray(pixels, dtype=np.uint8).reshape(-1, 3)
+        palette, indices = extract_palette(pixels)
+        budget = self.color_budget(len(pixels))
+        if len(palette) <= budget:
+            self.exact += 1
+        else:
+            mapping = None
+            if self.palette is not None and len(self.palette) <= budget:
+                mapping, errors = nearest(palette, self.palette)
+                if errors.max() > self.tolerance ** 2:
+                    mapping = None
+                else:
+                    self.reused += 1
+            if mapping is None:
+                self.palette = median_cut(palette, np.bincount(indices, minlength=len(palette)), budget)
+                mapping, _ = nearest(palette, self.palette)
+                self.rebuilt += 1
+            palette, indices = self.palette, mapping[indices]
+
+        self.frames += 1
+        self.bytes += encoded_size(len(palette), len(pixels))
+        return len(palette), palette.tobytes(), pack_indices(indices, bit_width(len(palette)))
+
+    def encode_rgb(self, rgb):
+        """
+        Encode a raw row-major RGB buffer within the budget.
+        """
+        return self.encode_pixels(np.frombuffer(rgb, dtype=np.uint8))
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "bytes_per_frame": self.bytes / self.frames if self.frames else 0.0,
+            "exact": self.exact,
+            "reused": self.reused,
+            "rebuilt": self.rebuilt,
+        }
@@ -0,0 +1,177 @@
+"""
+SPP frame building straight into preallocated buffers.
+
+An SPP frame is [0x01, size lo, size hi, cmd, args..., checksum lo,
+checksum hi, 0x02], where size = len(args) + 3 and the checksum is the sum
+of every byte between the start byte and the checksum. Frames are written
+in place into a bytearray and handed out as memoryviews, so building and
+sending a picture does not create intermediate lists or byte strings.
+"""
+import struct
+
+CHUNK_SIZE = 200  # animation bytes per 0x49 packet
+PIC_PREFIX = b"\x00\x0a\x0a\x04"
+FRAME_HEAD = struct.Struct("<BHHBB")  # 0xAA, frame size, timecode, 0, colour count
+
+CMD_DRAW_PIC = 0x44
+CMD_DRAW_ANIM = 0x49
+
+
+def packet_size(args_size):
+    return args_size + 7
+
+
+class FrameBuilder:
+    """
+    Builds SPP frames into a reusable scratch buffer. A memoryview returned
+    from command() or picture() is only valid until the next call; copy it
+    (bytes(view)) to keep it.
+    """
+
+    def __init__(self, size=1024):
+        self.scratch = bytearray(size)
+
+    def _target(self, size):
+        if len(self.scratch) < size:
+            # views handed out earlier keep the old buffer alive
+            self.scratch = bytearray(size)
+        return memoryview(self.scratch)[:size]
+
+    @staticmethod
+    def finish(view, cmd, end):
+        """
+        Write header and trailer around args already stored at view[4:end].
+        """
+        payload_size = end - 1  # args + cmd + checksum
+        view[0] = 1
+        view[1] = payload_size & 0xFF
+        view[2] = (payload_size >> 8) & 0xFF
+        view[3] = cmd
+        cs = sum(view[1:end]) & 0xFFFF
+        view[end] = cs & 0xFF
+        view[end + 1] = (cs >> 8) & 0xFF
+        view[end + 2] = 2
+        return view
+
+    def command(self, cmd, args):
+        """
+        Frame a command with raw argument bytes.
+        """
+        view = self._target(packet_size(len(args)))
+        view[4:4 + len(args)] = args
+        return self.finish(view, cmd, 4 + len(args))
+
+    def picture(self, nb_colors, palette, pixel_data):
+        """
+        Frame an encoded still picture (0x44).
+        """
+        frame_size = FRAME_HEAD.size + len(palette) + len(pixel_data)
+        view = self._target(packet_size(len(PIC_PREFIX) + frame_size))
+        pos = 4 + len(PIC_PREFIX)
+        view[4:pos] = PIC_PREFIX
+        FRAME_HEAD.pack_into(view, pos, 0xAA, frame_size, 0, 0, nb_colors & 0xFF)  # 256 colours wrap to 0
+        pos += FRAME_HEAD.size
+        view[pos:pos + len(palette)] = palette
+        pos += len(palette)
+        view[pos:pos + len(pixel_data)] = pixel_data
+        return self.finish(view, CMD_DRAW_PIC, pos + len(pixel_data))
+
+
+def append_anim_frame(data, nb_colors, palette, pixel_data, timecode):
+    """
+    Append one encoded animation frame to the bytearray data.
+    """
+    frame_size = FRAME_HEAD.size + len(palette) + len(pixel_data)
+    data += FRAME_HEAD.pack(0xAA, frame_size, timecode & 0xFFFF, 0, nb_colors & 0xFF)
+    data += palette
+    data += pixel_data
+
+
+def anim_packets(data, chunk_size=CHUNK_SIZE):
+    """
+    Split animation data into 0x49 packets. All packets are written into a
+    single new buffer and returned as memoryview slices of it.
+    """
+    total_size = len(data)
+    nchunks = -(-total_size // chunk_size)
+    buffer = bytearray(sum(packet_size(3 + min(chunk_size, total_size - i * chunk_size)) for i in range(nchunks)))
+    source = memoryview(data)
+    packets = []
+    offset = 0
+    for i in range(nchunks):
+        chunk = source[i * chunk_size:(i + 1) * chunk_size]
+        size = packet_size(3 + len(chunk))
+        view = memoryview(buffer)[offset:offset + size]
+        view[4] = total_size & 0xFF
+        view[5] = (total_size >> 8) & 0xFF
+        view[6] = i
+        view[7:7 + len(chunk)] = chunk
+        packets.append(FrameBuilder.finish(view, CMD_DRAW_ANIM, 7 + len(chunk)))
+        offset += size
+    return packets
+
+
+def sendall_vectored(sock, buffers, max_iov=512):
+    """
+    Write all buffers, several per system call when the socket supports
+    sendmsg, without joining them first.
+    """
+    if len(buffers) == 1 or not hasattr(sock, "sendmsg"):
+        for buf in buffers:
+            sock.sendall(buf)
+        return
+    views = [memoryview(buf) for buf in buffers]
+    i = 0
+    while i < len(views):
+        sent = sock.sendmsg(views[i:i + max_iov])
+        while sent:
+            if sent >= len(views[i]):
+                sent -= len(views[i])
+                i += 1
+            else:
+                views[i] = views[i][sent:]
+                sent = 0
+        while i < len(views) and not len(views[i]):
+            i += 1
+
+
+class NullSocket:
+    """
+    Socket stand-in that accepts and discards everything.
+    """
+
+    def sendall(self, data):
+        pass
+
+
+def measure_allocations(frames=1000):
+    """
+    Build and send frames of a worst-case 256-colour picture and report the
+    memory transiently allocated per frame (tracemalloc peak above the
+    baseline) plus net blocks left behind.
+    """
+    import sys
+    import tracemalloc
+
+    palette = bytes(range(256)) * 3
+    pixel_data = bytes(range(256))
+    builder = FrameBuilder()
+    sock = NullSocket()
+    sendall_vectored(sock, [builder.picture(256, palette, pixel_data)])  # warm up the scratch buffer
+
+    tracemalloc.start()
+    peak_total = 0
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(frames):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        sendall_vectored(sock, [builder.picture(256, palette, pixel_data)])
+        peak_total += tracemalloc.get_traced_memory()[1] - current
+    blocks_after = sys.getallocatedblocks()
+    tracemalloc.stop()
+    return {"frames": frames, "peak_bytes_per_frame": peak_total / frames,
+            "net_blocks_per_frame": (blocks_after - blocks_before) / frames}
+
+
+if __name__ == '__main__':
+    print(measure_allocations())
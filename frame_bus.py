@@ -0,0 +1,186 @@
+import struct
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from time import monotonic, monotonic_ns, sleep
+
+FRAME_WIDTH = 16
+FRAME_HEIGHT = 16
+FRAME_SIZE = FRAME_WIDTH * FRAME_HEIGHT * 3  # raw RGB, row-major
+
+DEFAULT_BUS_NAME = "pixoo-frames"
+
+
+class FrameBus:
+    """
+    Latest-frame slot shared by the threads of a single process.
+
+    The producer publishes raw RGB buffers, the sender waits for a sequence
+    number newer than the last one it consumed. Intermediate frames are
+    overwritten: the sender always gets the most recent one.
+    """
+
+    def __init__(self, frame_size=FRAME_SIZE):
+        self.frame_size = frame_size
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._frame = None
+        self._stamps = None
+        self._closed = False
+
+    def publish(self, frame, stamps=None):
+        """
+        Publish a raw RGB frame. Returns its sequence number.
+        stamps are optional (tick, render) monotonic_ns timestamps for frame
+        tracing; the publish time is added to them.
+        """
+        if len(frame) != self.frame_size:
+            raise ValueError(f"Frame must be {self.frame_size} bytes, got {len(frame)}")
+        with self._cond:
+            self._frame = bytes(frame)
+            self._stamps = tuple(stamps) + (monotonic_ns(),) if stamps else None
+            self._seq += 1
+            self._cond.notify_all()
+            return self._seq
+
+    def wait(self, last_seq=0, timeout=None):
+        """
+        Wait for a frame newer than last_seq. Returns (seq, frame), or None on
+        timeout or once the bus is closed.
+        """
+        item = self.wait_stamped(last_seq, timeout)
+        return item and item[:2]
+
+    def wait_stamped(self, last_seq=0, timeout=None):
+        """
+        Like wait, but returns (seq, frame, stamps); stamps is None unless the
+        producer passed them.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._seq > last_seq, timeout):
+                return None
+            if self._seq <= last_seq:
+                return None
+            return self._seq, self._frame, self._stamps
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class SharedFrameBus:
+    """
+    Latest-frame slot in shared memory, for a producer and a sender running in
+    two processes.
+
+    Layout: an 8-byte sequence counter, three 8-byte tracing timestamps
+    (tick, render, publish; zero when unused), then the frame. The counter is
+    used as a seqlock: it is odd while the producer is writing, so the reader
+    retries instead of picking up a half-written frame.
+    """
+
+    HEADER = struct.Struct("<Q")
+    STAMPS = struct.Struct("<QQQ")
+
+    def __init__(self, name=DEFAULT_BUS_NAME, frame_size=FRAME_SIZE, create=None, poll_interval=0.002):
+        """
+        Attach to the named bus, creating it if it does not exist yet (or
+        force either behaviour with create=True/False).
+        """
+        self.name = name
+        self.frame_size = frame_size
+        self.poll_interval = poll_interval
+        self._closed = False
+        size = self.HEADER.size + self.STAMPS.size + frame_size
+
+        self.owner = False
+        if create is not False:
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+                self.owner = True
+            except FileExistsError:
+                if create:
+                    raise
+        if not self.owner:
+            self._shm = shared_memory.SharedMemory(name=name)
+            # Attaching registers the segment with this process' resource
+            # tracker, which would unlink it on exit under the producer's feet.
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+            if self._shm.size < size:
+                raise ValueError(f"Shared frame bus '{name}' is too small for {frame_size}-byte frames")
+        else:
+            self.HEADER.pack_into(self._shm.buf, 0, 0)
+
+        self._frame_view = self._shm.buf[self.HEADER.size + self.STAMPS.size:size]
+        self._seq = self.HEADER.unpack_from(self._shm.buf, 0)[0]
+
+    def publish(self, frame, stamps=None):
+        """
+        Publish a raw RGB frame. Returns its sequence number.
+        stamps are optional (tick, render) monotonic_ns timestamps for frame
+        tracing; the publish time is added to them.
+        """
+        if len(frame) != self.frame_size:
+            raise ValueError(f"Frame must be {self.frame_size} bytes, got {len(frame)}")
+        buf = self._shm.buf
+        self.HEADER.pack_into(buf, 0, self._seq + 1)
+        if stamps:
+            self.STAMPS.pack_into(buf, self.HEADER.size, *stamps, monotonic_ns())
+        else:
+            self.STAMPS.pack_into(buf, self.HEADER.size, 0, 0, 0)
+        self._frame_view[:] = frame
+        self._seq += 2
+        self.HEADER.pack_into(buf, 0, self._seq)
+        return self._seq // 2
+
+    def read(self, retries=100):
+        """
+        Return (seq, frame, stamps) for the current frame, or None if nothing
+        was published yet or the producer is still (or forever, if it died
+        mid-publish) writing after retries attempts.
+        """
+        buf = self._shm.buf
+        for _ in range(retries):
+            before = self.HEADER.unpack_from(buf, 0)[0]
+            if before == 0:
+                return None
+            if before & 1:
+                sleep(0)  # let the producer finish
+                continue
+            stamps = self.STAMPS.unpack_from(buf, self.HEADER.size)
+            frame = bytes(self._frame_view)
+            if self.HEADER.unpack_from(buf, 0)[0] == before:
+                return before // 2, frame, stamps if stamps[0] else None
+        return None
+
+    def wait(self, last_seq=0, timeout=None):
+        """
+        Wait for a frame newer than last_seq. Returns (seq, frame), or None on
+        timeout or once the bus is closed.
+        """
+        item = self.wait_stamped(last_seq, timeout)
+        return item and item[:2]
+
+    def wait_stamped(self, last_seq=0, timeout=None):
+        """
+        Like wait, but returns (seq, frame, stamps); stamps is None unless the
+        producer passed them.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while not self._closed:
+            current = self.read()
+            if current is not None and current[0] > last_seq:
+                return current
+            if deadline is not None and monotonic() >= deadline:
+                return None
+            sleep(self.poll_interval)
+        return None
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._frame_view.release()
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
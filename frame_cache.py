@@ -0,0 +1,84 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+    """
+    Bounded LRU cache of fully encoded SPP packets, keyed by a hash of the
+    source pixel data plus the command parameters. A hit turns a draw call
+    into a plain socket write.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(kind, content, *params):
+        """
+        Build a cache key from the command kind, the source bytes (file
+        contents or raw pixels) and any parameters that change the output.
+        """
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        return (kind, digest) + params
+
+    def get(self, key):
+        """
+        Return the cached packets for key, or None.
+        """
+        with self._lock:
+            packets = self._entries.get(key)
+            if packets is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return packets
+
+    def put(self, key, packets):
+        """
+        Store a list of encoded packets, evicting least recently used entries
+        to stay within the limits. Entries larger than max_bytes are not kept.
+        """
+        packets = [bytes(packet) for packet in packets]
+        size = sum(len(packet) for packet in packets)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= sum(len(packet) for packet in old)
+            self._entries[key] = packets
+            self.size_bytes += size
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= sum(len(packet) for packet in evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
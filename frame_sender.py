@@ -0,0 +1,126 @@
+import hashlib
+from time import monotonic
+
+import numpy as np
+from PIL import Image
+
+import frame_trace
+
+
+class FrameSender:
+    """
+    Push still frames to a Pixoo without flooding the link.
+
+    Frames identical to the last one sent are skipped, output is capped at
+    max_fps (the newest frame offered in between wins), and the last frame is
+    re-sent every keepalive seconds so a dropped packet cannot leave the panel
+    stale for long. With a quantizer (an encoder.Quantizer), frames are
+    encoded within its colour/byte budget instead of exactly.
+    """
+
+    def __init__(self, pixoo, max_fps=10, keepalive=5.0, quantizer=None):
+        self.pixoo = pixoo
+        self.quantizer = quantizer
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.keepalive = keepalive
+
+        self._last_digest = None
+        self._last_frame = None
+        self._last_send = None
+        self._pending = None
+        self._pending_digest = None
+        self._pending_id = None
+
+        self.offered = 0
+        self.sent = 0
+        self.skipped = 0
+        self.keepalives = 0
+        self.bytes_sent = 0  # palette and pixel bytes
+
+    def offer_rgb(self, rgb):
+        """
+        Offer a raw RGB buffer at the device's resolution.
+        """
+        if self.quantizer is not None:
+            encoded = self.quantizer.encode_rgb(rgb)
+        else:
+            encoded = self.pixoo.encode_rgb(rgb)
+        if frame_trace.tracer is not None:
+            frame_trace.tracer.mark("encode")
+        self.offer(encoded)
+
+    def offer_file(self, filepath):
+        """
+        Offer an image file.
+        """
+        if self.quantizer is not None:
+            img = self.pixoo.profile.fit(Image.open(filepath).convert("RGB"))
+            self.offer(self.quantizer.encode_pixels(np.asarray(img)))
+        else:
+            self.offer(self.pixoo.encode_image(filepath))
+
+    def offer(self, encoded):
+        """
+        Offer an encoded frame (nb_colors, palette, pixel_data). It is sent on
+        the next flush() that the frame rate cap allows, unless a newer frame
+        replaces it first.
+        """
+        _, palette, pixel_data = encoded
+        digest = hashlib.blake2b(bytes(palette) + bytes(pixel_data), digest_size=16).digest()
+        self.offered += 1
+        if self._pending is not None:
+            self.skipped += 1  # superseded before it went out
+            self._pending = None
+        if digest == self._last_digest:
+            self.skipped += 1  # the panel already shows it
+            return
+        self._pending = encoded
+        self._pending_digest = digest
+        self._pending_id = frame_trace.tracer.current if frame_trace.tracer is not None else None
+
+    def time_until_due(self):
+        """
+        Seconds until flush() has something to do, or None if nothing will be
+        due until a new frame is offered.
+        """
+        if self._last_send is None:
+            return 0.0 if self._pending is not None else None
+        elapsed = monotonic() - self._last_send
+        if self._pending is not None:
+            return max(self.min_interval - elapsed, 0.0)
+        if self.keepalive:
+            return max(self.keepalive - elapsed, 0.0)
+        return None
+
+    def flush(self):
+        """
+        Send the pending frame, or a keep-alive refresh, if one is due.
+        Returns True if something was sent.
+        """
+        now = monotonic()
+        elapsed = None if self._last_send is None else now - self._last_send
+        if self._pending is not None:
+            if elapsed is not None and elapsed < self.min_interval:
+                return False
+            frame, self._pending = self._pending, None
+            self._last_digest = self._pending_digest
+            self._last_frame = frame
+            frame_id = self._pending_id
+        elif self._last_frame is not None and self.keepalive and elapsed >= self.keepalive:
+            frame = self._last_frame
+            frame_id = None
+            self.keepalives += 1
+        else:
+            return False
+
+        if frame_trace.tracer is not None:
+            frame_trace.tracer.resume(frame_id)
+
+        self._last_send = now
+        self.sent += 1
+        self.bytes_sent += len(frame[1]) + len(frame[2])
+        self.pixoo.draw_encoded(*frame)
+        return True
+
+    def bytes_per_frame(self):
+        return self.bytes_sent / self.sent if self.sent else 0.0
@@ -0,0 +1,298 @@
+"""
+Frame server: one long-running process owns the link to the Pixoo and
+shares it between producers (the game, stream.py, text overlays, ...).
+
+Producers connect to a Unix socket and speak plain SPP, as to a device,
+after a hello line giving their priority (see transport.ServerTransport;
+a client without one gets the default priority). The display belongs to
+the highest-priority producer that has something to show, the most recent
+one among equals. Content from other producers is kept, not forwarded, and
+the next owner's latest picture or animation is re-sent as soon as the
+owner releases the display or disconnects. Brightness and other commands
+that do not change what is shown are always forwarded. Switching producers
+costs a Unix socket connect instead of a Bluetooth connect.
+
+    python frame_server.py --device 11:75:58:81:e8:b6
+    python main_script.py --device "server:///tmp/pixoo.sock?priority=10&name=game"
+    python TEXT.py --server /tmp/pixoo.sock
+"""
+import argparse
+import json
+import os
+import socket
+import threading
+from time import monotonic, sleep
+
+import send_queue
+from client import Pixoo
+from pixoo_emulator import CMD_DRAW_ANIM, CMD_DRAW_PIC, CMD_SET_BOX_MODE, SppParser
+from transport import DEFAULT_PRIORITY, SERVER_HELLO, ServerTransport
+
+DEFAULT_SOCKET = "/tmp/pixoo.sock"
+
+BACKGROUND = 0  # screen mirroring, GIF browsing
+GAME = DEFAULT_PRIORITY
+OVERLAY = 20  # text and notifications
+
+CMD_SET_COLOR = 0x6F
+CMD_RELEASE = 0xF0  # handled by the server: the producer stops showing anything
+
+# commands that replace what is shown, and how they are queued
+DISPLAY_COMMANDS = {
+    CMD_DRAW_PIC: send_queue.FRAME,
+    CMD_SET_BOX_MODE: send_queue.CONTROL,
+    CMD_SET_COLOR: send_queue.CONTROL,
+}
+
+
+class Producer:
+    """
+    A connected client and the content it would like to show.
+    """
+
+    def __init__(self, conn, priority, name):
+        self.conn = conn
+        self.priority = priority
+        self.name = name
+        self.display = None  # (packets, kind) to show while this producer owns the display
+        self.updated = 0  # order of the last update, the newest wins among equal priorities
+        self.received = 0
+        self.suppressed = 0
+        self._anim = []  # 0x49 packets of an upload in progress
+        self._anim_left = 0
+
+
+class FrameServer:
+    """
+    Accepts producers on a Unix socket and arbitrates the display of a
+    connected Pixoo, which is switched to background sending.
+    """
+
+    def __init__(self, pixoo, path=DEFAULT_SOCKET):
+        self.pixoo = pixoo
+        self.path = path
+        self.producers = []
+        self.owner = None
+        self.forwarded = 0
+        self.switches = 0
+        self.switch_times = []  # seconds from a switch to the new owner's content being written
+        self._order = 0
+        self._clients = 0
+        self._closing = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+        pixoo.start_background()
+
+    def url(self, priority=DEFAULT_PRIORITY, name=""):
+        """
+        Address in the form accepted by Pixoo(...).
+        """
+        return str(ServerTransport(self.path, priority, name))
+
+    def serve_forever(self):
+        while not self._closing:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def start(self):
+        """
+        Serve from a background thread; returns self.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name="frame-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._closing = True
+        try:
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+        with self._lock:
+            producers = list(self.producers)
+        for producer in producers:
+            try:
+                producer.conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _handshake(self, conn):
+        """
+        Read the optional hello line. Returns (priority, name, leftover data),
+        or None if the client went away first.
+        """
+        data = b""
+        while len(data) < len(SERVER_HELLO) and SERVER_HELLO.startswith(data):
+            chunk = conn.recv(4096)
+            if not chunk:
+                return None
+            data += chunk
+        self._clients += 1
+        if not data.startswith(SERVER_HELLO):
+            return DEFAULT_PRIORITY, f"client-{self._clients}", data
+        while b"\n" not in data:
+            chunk = conn.recv(4096)
+            if not chunk:
+                return None
+            data += chunk
+        line, _, rest = data.partition(b"\n")
+        fields = line.decode(errors="replace").split(" ", 2)[1:]
+        try:
+            priority = int(fields[0]) if fields else DEFAULT_PRIORITY
+        except ValueError:
+            priority = DEFAULT_PRIORITY
+        name = fields[1] if len(fields) > 1 and fields[1] else f"client-{self._clients}"
+        return priority, name, rest
+
+    def _serve_client(self, conn):
+        with conn:
+            try:
+                hello = self._handshake(conn)
+            except OSError:
+                return
+            if hello is None:
+                return
+            priority, name, data = hello
+            producer = Producer(conn, priority, name)
+            parser = SppParser()
+            with self._lock:
+                self.producers.append(producer)
+            print(f"Producer {name} connected (priority {priority})")
+            try:
+                while True:
+                    for frame in parser.frames(data):
+                        self._handle(producer, frame)
+                    data = conn.recv(65536)
+                    if not data:
+                        break
+            except OSError:
+                pass
+            with self._lock:
+                self.producers.remove(producer)
+                producer.display = None
+                self._arbitrate(producer)
+            print(f"Producer {name} disconnected")
+
+    def _handle(self, producer, frame):
+        producer.received += 1
+        cmd = frame[3]
+        if cmd == CMD_DRAW_ANIM:
+            # an animation is only shown once all its chunks are in
+            args = frame[4:-3]
+            if args[2] == 0:
+                producer._anim = []
+                producer._anim_left = args[0] | (args[1] << 8)
+            producer._anim.append(frame)
+            producer._anim_left -= len(args) - 3
+            if producer._anim_left <= 0:
+                self.show(producer, (producer._anim, send_queue.ANIM))
+                producer._anim = []
+        elif cmd in DISPLAY_COMMANDS:
+            self.show(producer, ([frame], DISPLAY_COMMANDS[cmd]))
+        elif cmd == CMD_RELEASE:
+            self.show(producer, None)
+        else:
+            self._forward([frame], send_queue.CONTROL)
+
+    def show(self, producer, display):
+        """
+        Set what producer wants shown (None: nothing) and forward whatever the
+        display owner should show now.
+        """
+        with self._lock:
+            producer.display = display
+            if display is not None:
+                self._order += 1
+                producer.updated = self._order
+            self._arbitrate(producer)
+
+    def _arbitrate(self, producer):
+        """
+        Pick the owner after producer changed; called with the lock held.
+        """
+        candidates = [p for p in self.producers if p.display is not None]
+        owner = max(candidates, key=lambda p: (p.priority, p.updated)) if candidates else None
+        if owner is not self.owner:
+            self.owner = owner
+            if owner is not None:
+                self.switches += 1
+                started = monotonic()
+                sent = self._forward(*owner.display)
+                if hasattr(sent, "add_done_callback"):
+                    sent.add_done_callback(lambda _: self.switch_times.append(monotonic() - started))
+                print(f"Display owned by {owner.name}")
+        elif owner is producer:
+            self._forward(*owner.display)
+        elif producer.display is not None:
+            producer.suppressed += 1
+
+    def _forward(self, packets, kind):
+        self.forwarded += 1
+        return self.pixoo.draw_packets(packets, kind)
+
+    def stats(self):
+        with self._lock:
+            producers = [{"name": p.name, "priority": p.priority, "received": p.received,
+                          "suppressed": p.suppressed, "owner": p is self.owner} for p in self.producers]
+        switch_times = sorted(self.switch_times)
+        stats = {
+            "producers": producers,
+            "forwarded": self.forwarded,
+            "switches": self.switches,
+            "p50_switch_ms": switch_times[len(switch_times) // 2] * 1000 if switch_times else None,
+            "connection": self.pixoo.connection.stats(),
+        }
+        queue = self.pixoo.send_queue
+        if queue is not None:
+            stats.update({"sent": queue.sent, "coalesced": queue.coalesced, "dropped": queue.dropped})
+        return stats
+
+
+class FrameServerClient(Pixoo):
+    """
+    A Pixoo drawn through a frame server: the usual draw and control calls,
+    plus release() to hand the display back to lower priorities.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET, priority=GAME, name="", cache=None, profile=None):
+        transport = ServerTransport(path, priority, name)
+        super().__init__(str(transport), cache, transport, profile=profile)
+
+    def release(self):
+        return self.send(CMD_RELEASE, [])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Share one Pixoo connection between several producers")
+    parser.add_argument("--device", default=Pixoo.BDADDR, help="device or emulator address")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket to listen on")
+    parser.add_argument("--stats-interval", type=float, default=30.0, help="print stats every N seconds")
+    cli_args = parser.parse_args()
+
+    pixoo = Pixoo(cli_args.device)
+    pixoo.connect()
+    pixoo.connection.start_monitor()
+    server = FrameServer(pixoo, cli_args.socket).start()
+    print(f"Frame server listening on {cli_args.socket}")
+    try:
+        while True:
+            sleep(cli_args.stats_interval)
+            print(json.dumps(server.stats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        pixoo.stop_background()
+        pixoo.connection.close()
@@ -0,0 +1,191 @@
+"""
+Optional per-frame latency tracing, from game tick to socket write.
+
+Each frame is identified by its frame bus sequence number and timestamped
+(time.monotonic_ns, which is system-wide, so stamps taken in the game
+process line up with the sender's) at these stages:
+
+    tick        game loop iteration started
+    render      board rendered into the frame buffer
+    publish     frame handed to the frame bus
+    receive     sender picked the frame up
+    encode      palette and pixels encoded
+    build       SPP packet(s) built
+    send_start  first byte handed to the socket
+    send_end    last byte handed to the socket
+
+The time between consecutive stages goes into per-stage log2 histograms,
+summarised on the console and in a JSON stats file every few seconds.
+
+Tracing is off unless enable() is called: call sites check the module-level
+`tracer` against None and do nothing else.
+"""
+import json
+import os
+import threading
+from time import monotonic, monotonic_ns
+
+STAGES = ("tick", "render", "publish", "receive", "encode", "build", "send_start", "send_end")
+GAME_STAGES = STAGES[:3]  # carried across the frame bus
+
+tracer = None
+
+
+class Histogram:
+    """
+    Log2-bucketed histogram of durations in microseconds.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * 40
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, micros):
+        self.buckets[min(int(micros).bit_length(), len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.total += micros
+        if micros > self.max:
+            self.max = micros
+
+    def percentile(self, fraction):
+        """
+        Upper bound of the bucket holding the given fraction of samples.
+        """
+        if not self.count:
+            return 0
+        wanted = fraction * self.count
+        seen = 0
+        for bit_length, n in enumerate(self.buckets):
+            seen += n
+            if seen >= wanted:
+                return min((1 << bit_length) - 1, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count if self.count else 0,
+            "p50_us": self.percentile(0.5),
+            "p99_us": self.percentile(0.99),
+            "max_us": self.max,
+        }
+
+
+class FrameTracer:
+    """
+    Collects stage timestamps per frame. Frames that never reach send_end
+    (deduplicated, superseded) are dropped once max_open frames are pending.
+    """
+
+    def __init__(self, summary_interval=10.0, stats_path=None, max_open=64):
+        self.summary_interval = summary_interval
+        self.stats_path = stats_path
+        self.max_open = max_open
+        self.histograms = {stage: Histogram() for stage in STAGES[1:] + ("total",)}
+        self.completed = 0
+        self.dropped = 0
+        self._open = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_report = monotonic()
+
+    @property
+    def current(self):
+        """
+        Frame id this thread is working on, or None.
+        """
+        return getattr(self._local, "frame_id", None)
+
+    def begin(self, frame_id, stamps=None):
+        """
+        Start tracking a frame in this thread. stamps are the game side
+        (tick, render, publish) timestamps carried by the frame bus, if any.
+        """
+        now = monotonic_ns()
+        marks = dict(zip(GAME_STAGES, stamps)) if stamps else {}
+        marks["receive"] = now
+        with self._lock:
+            self._open[frame_id] = marks
+            while len(self._open) > self.max_open:
+                self._open.pop(next(iter(self._open)))
+                self.dropped += 1
+        self._local.frame_id = frame_id
+
+    def resume(self, frame_id):
+        """
+        Make frame_id the current frame of this thread again.
+        """
+        self._local.frame_id = frame_id
+
+    def mark(self, stage, frame_id=None):
+        """
+        Timestamp a stage for frame_id, or for this thread's current frame.
+        """
+        frame_id = self.current if frame_id is None else frame_id
+        if frame_id is None:
+            return
+        marks = self._open.get(frame_id)
+        if marks is not None:
+            marks[stage] = monotonic_ns()
+        if stage == "send_end":
+            self.finish(frame_id)
+
+    def finish(self, frame_id):
+        with self._lock:
+            marks = self._open.pop(frame_id, None)
+            if marks is None:
+                return
+            previous = None
+            for stage in STAGES:
+                stamp = marks.get(stage)
+                if stamp is None:
+                    continue
+                if previous is not None:
+                    self.histograms[stage].add((stamp - previous) / 1000)
+                previous = stamp
+            first = min(marks.values())
+            self.histograms["total"].add((max(marks.values()) - first) / 1000)
+            self.completed += 1
+        if self.current == frame_id:
+            self._local.frame_id = None
+        self.maybe_report()
+
+    def summary(self):
+        with self._lock:
+            return {
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "stages": {stage: hist.summary() for stage, hist in self.histograms.items() if hist.count},
+            }
+
+    def maybe_report(self, force=False):
+        now = monotonic()
+        if not force and now - self._last_report < self.summary_interval:
+            return
+        self._last_report = now
+        summary = self.summary()
+        print(f"[trace] {summary['completed']} frames, {summary['dropped']} dropped")
+        for stage, stats in summary["stages"].items():
+            print(f"[trace]   {stage:10} n={stats['count']:<7} mean {stats['mean_us']:9.0f} us  "
+                  f"p50 {stats['p50_us']:9.0f} us  p99 {stats['p99_us']:9.0f} us  max {stats['max_us']:9.0f} us")
+        if self.stats_path:
+            tmp_path = self.stats_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(summary, f, indent=2)
+            os.replace(tmp_path, self.stats_path)
+
+
+def enable(summary_interval=10.0, stats_path=None):
+    """
+    Turn tracing on for this process and return the tracer.
+    """
+    global tracer
+    tracer = FrameTracer(summary_interval, stats_path)
+    return tracer
+
+
+def disable():
+    global tracer
+    tracer = None
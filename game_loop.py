@@ -0,0 +1,139 @@
+"""
+Fixed-timestep scheduling for the game, independent of pygame.
+
+The simulation advances in ticks of 1/tick_rate seconds, however often the
+caller polls input or draws. Key presses are applied on the next tick, held
+keys repeat with DAS/ARR timing (a delay before auto-repeat, then a repeat
+interval), and gravity fires at the interval of the engine's current level.
+"""
+from collections import deque
+
+import tetris_engine
+
+REPEATABLE = (tetris_engine.LEFT, tetris_engine.RIGHT, tetris_engine.DOWN)
+
+
+class KeyRepeat:
+    """
+    Auto-repeat for held actions: first repeat das seconds after the press,
+    then one every arr seconds. das=None disables repeating.
+    """
+
+    def __init__(self, das=0.17, arr=0.05, repeatable=REPEATABLE):
+        self.das = das
+        self.arr = arr
+        self.repeatable = repeatable
+        self._held = {}  # action -> time of the next repeat
+
+    def press(self, action, now):
+        if self.das is not None and action in self.repeatable:
+            self._held[action] = now + self.das
+
+    def release(self, action):
+        self._held.pop(action, None)
+
+    def clear(self):
+        self._held.clear()
+
+    def update(self, now):
+        """
+        Actions repeating at time now.
+        """
+        actions = []
+        for action, due in self._held.items():
+            if now >= due:
+                actions.append(action)
+                # ARR of 0 means one repeat per tick
+                self._held[action] = max(due + self.arr, now) if self.arr else now
+        return actions
+
+
+class GameScheduler:
+    """
+    Drives a TetrisEngine at a fixed tick rate. Call press/release from the
+    input handler and advance() with the elapsed wall time; on_action, if
+    set, is called as on_action(tick, action) for every action applied.
+    """
+
+    def __init__(self, engine, tick_rate=60, das=0.17, arr=0.05, max_frame_time=0.25):
+        self.engine = engine
+        self.dt = 1.0 / tick_rate
+        self.max_frame_time = max_frame_time
+        self.repeat = KeyRepeat(das, arr)
+        self.on_action = None
+        self.tick = 0
+        self._inputs = deque()
+        self._accumulator = 0.0
+        self._gravity = 0.0
+
+    @property
+    def time(self):
+        """
+        Simulated seconds since the start.
+        """
+        return self.tick * self.dt
+
+    def press(self, action):
+        self._inputs.append((action, True))
+
+    def tap(self, action):
+        """
+        Press and release before the next tick: no key repeat.
+        """
+        self._inputs.append((action, False))
+
+    def release(self, action):
+        self.repeat.release(action)
+
+    def reset(self):
+        """
+        Start a new game: reset the engine, gravity and key repeat.
+        """
+        if self.on_action is not None:
+            self.on_action(self.tick, tetris_engine.RESET)
+        self.engine.reset()
+        self._inputs.clear()
+        self.repeat.clear()
+        self._gravity = 0.0
+
+    def apply(self, action):
+        if self.on_action is not None:
+            self.on_action(self.tick, action)
+        return self.engine.step(action)
+
+    def advance(self, elapsed):
+        """
+        Run as many ticks as fit in elapsed seconds (plus what was left over
+        last time). A long stall is capped at max_frame_time so the game
+        slows down instead of spiralling. Returns the number of ticks run.
+        """
+        self._accumulator += min(elapsed, self.max_frame_time)
+        ticks = 0
+        while self._accumulator >= self.dt:
+            self._accumulator -= self.dt
+            self.step()
+            ticks += 1
+        return ticks
+
+    def step(self):
+        """
+        One simulation tick: queued presses, key repeats, then gravity.
+        """
+        self.tick += 1
+        now = self.time
+        engine = self.engine
+        if engine.game_over:
+            self._inputs.clear()
+            return
+        while self._inputs:
+            action, held = self._inputs.popleft()
+            self.apply(action)
+            if held:
+                self.repeat.press(action, now)
+        for action in self.repeat.update(now):
+            self.apply(action)
+        self._gravity += self.dt
+        interval = tetris_engine.gravity_interval(engine.level)
+        if self._gravity >= interval and not engine.game_over:
+            self._gravity -= interval
+            self.apply(tetris_engine.GRAVITY)
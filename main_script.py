@@ -1,30 +1,121 @@
+import argparse
+import threading
 from time import sleep
 
+import frame_trace
+import encoder
 from client import Pixoo
+from device_group import DeviceGroup
+from device_profile import PROFILES, get_profile
+from frame_bus import DEFAULT_BUS_NAME, FrameBus, SharedFrameBus
+from frame_sender import FrameSender
 
 
-def main():
-    pixoo = Pixoo("11:75:58:81:e8:b6")
-    pixoo.connect()
+def push_from_file(sender, image_path="image.png", poll_interval=0.02):
+    """
+    Legacy path: poll the PNG written by the game.
+    """
+    while True:
+        try:
+            sender.offer_file(image_path)
+            sender.flush()
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        sleep(poll_interval)
+
+
+def push_from_bus(sender, frame_bus):
+    """
+    Send new frames published on the bus.
+    """
+    seq = 0
+    while True:
+        timeout = sender.time_until_due()
+        item = frame_bus.wait_stamped(seq, timeout=1 if timeout is None else timeout)
+        try:
+            if item is not None:
+                seq, frame, stamps = item
+                if frame_trace.tracer is not None:
+                    frame_trace.tracer.begin(seq, stamps)
+                sender.offer_rgb(frame)
+            sender.flush()
+        except Exception as e:
+            print(f"An error occurred: {e}")
 
-    print("Connected to Pixoo")
 
+def report_sent(sender, interval=10.0):
+    """
+    Print how many bytes each frame took, alongside the trace summaries.
+    """
     while True:
-        if True:
-            try:
-                sleep(0.01)
-                pixoo.draw_pic("image.png")
-            except Exception as e:
-                print(f"An error occurred: {e}")
-            sleep(0.01)
-        else:
-            try:
-                print("YES")
-                pixoo.draw_text(str("score"), 12, 100, (255, 255, 255), (0, 0, 0))
-            except Exception as e:
-                print(f"An error occurred: {e}")
-            sleep(0.01)
+        sleep(interval)
+        print(f"[trace] sent {sender.sent} frames ({sender.keepalives} keep-alives, {sender.skipped} skipped), "
+              f"{sender.bytes_per_frame():.0f} palette+pixel bytes/frame")
+
+
+def main(source="file", bus_name=DEFAULT_BUS_NAME, max_fps=10, keepalive=5.0, trace_file=None, trace=False,
+         devices=None, max_colors=None, max_bytes=None, profile=None):
+    """
+    source is one of:
+      "file"   - poll image.png written by TetrisGame.py
+      "shm"    - read the shared-memory bus of `TetrisGame.py --bus NAME`
+      "inline" - run the game in this process and hand frames over in memory
+    With trace, per-stage frame latencies and bytes per frame are summarised
+    every 10 seconds (the latencies are also written to trace_file). With several devices, each frame is encoded
+    once and sent to all of them. max_colors/max_bytes turn on lossy palette
+    quantization to fit more frames through the link. profile is the
+    panel's DeviceProfile (or its name); the game is scaled up to it.
+    """
+    if trace or trace_file:
+        frame_trace.enable(stats_path=trace_file)
+
+    profile = get_profile(profile)
+    devices = devices or [Pixoo.BDADDR]
+    if len(devices) > 1:
+        pixoo = DeviceGroup(devices, profile=profile)
+        pixoo.connect()
+    else:
+        pixoo = Pixoo(devices[0], profile=profile)
+        pixoo.connect()
+        pixoo.connection.start_monitor()  # reconnect in the background from now on
+
+    print("Connected to Pixoo")
+
+    quantizer = None
+    if max_colors or max_bytes:
+        quantizer = encoder.Quantizer(max_colors, max_bytes)
+    sender = FrameSender(pixoo, max_fps=max_fps, keepalive=keepalive, quantizer=quantizer)
+    if frame_trace.tracer is not None:
+        threading.Thread(target=report_sent, args=(sender, frame_trace.tracer.summary_interval), daemon=True).start()
+    if source == "file":
+        push_from_file(sender)
+    elif source == "shm":
+        push_from_bus(sender, SharedFrameBus(bus_name, profile.frame_size))
+    elif source == "inline":
+        from TetrisGame import run_tetris_game
+
+        frame_bus = FrameBus(profile.frame_size)
+        threading.Thread(target=push_from_bus, args=(sender, frame_bus), daemon=True).start()
+        # pygame wants the main thread
+        run_tetris_game(frame_bus, trace=frame_trace.tracer is not None, profile=profile)
+    else:
+        raise ValueError(f"Unknown frame source: {source}")
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Push game frames to the Pixoo")
+    parser.add_argument("--source", choices=["file", "shm", "inline"], default="file")
+    parser.add_argument("--bus", default=DEFAULT_BUS_NAME, help="shared-memory bus name for --source shm")
+    parser.add_argument("--max-fps", type=float, default=10, help="cap on frames sent per second")
+    parser.add_argument("--keepalive", type=float, default=5.0,
+                        help="re-send the current frame after this many idle seconds (0 to disable)")
+    parser.add_argument("--device", action="append", dest="devices",
+                        help="device address (repeat to drive several devices; default %s)" % Pixoo.BDADDR)
+    parser.add_argument("--max-colors", type=int, help="quantize frames to at most this many colours")
+    parser.add_argument("--max-bytes", type=int, help="quantize frames to at most this many palette+pixel bytes")
+    parser.add_argument("--trace", action="store_true", help="print per-stage frame latency summaries")
+    parser.add_argument("--trace-file", help="also write the latency stats as JSON to this file")
+    parser.add_argument("--profile", choices=list(PROFILES), default="16", help="panel resolution")
+    cli_args = parser.parse_args()
+    main(cli_args.source, cli_args.bus, cli_args.max_fps, cli_args.keepalive, cli_args.trace_file, cli_args.trace,
+         cli_args.devices, cli_args.max_colors, cli_args.max_bytes, cli_args.profile)
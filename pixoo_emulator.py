@@ -0,0 +1,348 @@
+"""
+Emulated Pixoo for offline testing and benchmarking.
+
+Listens on TCP or a Unix socket, parses the SPP frames produced by
+Pixoo.send, checks their header, length and checksum, and decodes the
+commands the client uses: 0x44 (still picture), 0x49 (animation chunks),
+0x74 (brightness) and 0x45 (box mode). Pictures are rebuilt as RGB at the
+resolution of a device profile (16x16 by default) and can be dumped as
+PNG. The link can be slowed down to a given bandwidth and latency to mimic
+RFCOMM.
+
+    python pixoo_emulator.py --tcp 127.0.0.1:7777 --bandwidth 3000 --latency 0.02
+    python main_script.py ... with Pixoo("tcp://127.0.0.1:7777")
+"""
+import argparse
+import json
+import os
+import socket
+import threading
+from time import monotonic, sleep
+
+import numpy as np
+
+from device_profile import PROFILES, get_profile
+from encoder import bit_width
+
+FRAME_START = 0x01
+FRAME_END = 0x02
+
+CMD_DRAW_PIC = 0x44
+CMD_DRAW_ANIM = 0x49
+CMD_SET_BRIGHTNESS = 0x74
+CMD_SET_BOX_MODE = 0x45
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def decode_picture(data, offset=0, width=16, height=16):
+    """
+    Decode one 0xAA picture frame starting at offset.
+    Returns (rgb bytes, timecode, offset of the next frame).
+    """
+    if data[offset] != 0xAA:
+        raise ProtocolError(f"Bad picture marker 0x{data[offset]:02X}")
+    frame_size = data[offset + 1] | (data[offset + 2] << 8)
+    timecode = data[offset + 3] | (data[offset + 4] << 8)
+    nb_colors = data[offset + 6] or 256
+    palette_start = offset + 7
+    pixels_start = palette_start + 3 * nb_colors
+    end = offset + frame_size
+    if end > len(data) or pixels_start > end:
+        raise ProtocolError("Truncated picture frame")
+
+    palette = np.frombuffer(data, np.uint8, 3 * nb_colors, palette_start).reshape(nb_colors, 3)
+    bitwidth = bit_width(nb_colors)
+    count = width * height
+    bits = np.unpackbits(np.frombuffer(data, np.uint8, end - pixels_start, pixels_start), bitorder="little")
+    if len(bits) < count * bitwidth:
+        bits = np.concatenate([bits, np.zeros(count * bitwidth - len(bits), np.uint8)])  # missing bits read as 0
+    indices = bits[:count * bitwidth].reshape(count, bitwidth).astype(np.int64) @ (1 << np.arange(bitwidth))
+    index = int(indices.max())
+    if index >= nb_colors:
+        raise ProtocolError(f"Palette index {index} out of range ({nb_colors} colours)")
+    return palette[indices].tobytes(), timecode, end
+
+
+class SppParser:
+    """
+    Incremental SPP frame parser: feed raw bytes, get (cmd, args) tuples.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.errors = 0
+
+    def feed(self, data):
+        return [(frame[3], frame[4:-3]) for frame in self.frames(data)]
+
+    def frames(self, data):
+        """
+        Like feed, but returns the complete, checked SPP frames as bytes.
+        """
+        self._buffer += data
+        frames = []
+        buf = self._buffer
+        while True:
+            start = buf.find(FRAME_START)
+            if start < 0:
+                if buf:
+                    self.errors += 1
+                buf.clear()
+                break
+            if start:
+                self.errors += 1  # garbage between frames
+                del buf[:start]
+            if len(buf) < 3:
+                break
+            payload_size = buf[1] | (buf[2] << 8)
+            total = payload_size + 4
+            if payload_size < 3:
+                self.errors += 1
+                del buf[:1]
+                continue
+            if len(buf) < total:
+                break
+            frame = bytes(buf[:total])
+            checksum = frame[-3] | (frame[-2] << 8)
+            if frame[-1] != FRAME_END or sum(frame[1:-3]) & 0xFFFF != checksum:
+                self.errors += 1
+                del buf[:1]  # resync on the next start byte
+                continue
+            del buf[:total]
+            frames.append(frame)
+        return frames
+
+
+class EmulatedPixoo:
+    """
+    Device state rebuilt from the decoded commands.
+    """
+
+    def __init__(self, dump_dir=None, profile=None):
+        self.dump_dir = dump_dir
+        self.profile = get_profile(profile)
+        self.brightness = None
+        self.box_mode = None
+        self.image = None  # last displayed RGB picture
+        self.animation = []  # [(rgb, timecode)] of the last complete upload
+        self._anim_buffer = bytearray()
+        self._anim_total = None
+        self._anim_next_chunk = 0
+        self._lock = threading.Lock()
+
+        self.commands = {}
+        self.pictures = 0
+        self.animations = 0
+        self.errors = 0
+        self.frame_times = []  # (arrival, displayed) per picture or animation
+
+    def handle(self, cmd, args, arrival):
+        with self._lock:
+            self.commands[cmd] = self.commands.get(cmd, 0) + 1
+            try:
+                if cmd == CMD_DRAW_PIC:
+                    # 4-byte prefix, then one picture frame
+                    self.image, _, _ = decode_picture(args, 4, *self.profile.size)
+                    self.pictures += 1
+                    self._displayed(arrival, [self.image])
+                elif cmd == CMD_DRAW_ANIM:
+                    self._anim_chunk(args, arrival)
+                elif cmd == CMD_SET_BRIGHTNESS:
+                    self.brightness = args[0]
+                elif cmd == CMD_SET_BOX_MODE:
+                    self.box_mode = tuple(args[:3])
+            except (ProtocolError, IndexError) as e:
+                self.errors += 1
+                print(f"[emulator] Bad 0x{cmd:02X} command: {e}")
+
+    def _anim_chunk(self, args, arrival):
+        total = args[0] | (args[1] << 8)
+        index = args[2]
+        if index == 0:
+            self._anim_buffer.clear()
+            self._anim_total = total
+            self._anim_next_chunk = 0
+        if total != self._anim_total or index != self._anim_next_chunk:
+            raise ProtocolError(f"Unexpected animation chunk {index} of {total} bytes")
+        self._anim_buffer += args[3:]
+        self._anim_next_chunk += 1
+        if len(self._anim_buffer) < total:
+            return
+        if len(self._anim_buffer) > total:
+            raise ProtocolError("Animation longer than announced")
+
+        frames = []
+        offset = 0
+        while offset < total:
+            rgb, timecode, offset = decode_picture(self._anim_buffer, offset, *self.profile.size)
+            frames.append((rgb, timecode))
+        self.animation = frames
+        self.image = frames[0][0]
+        self.animations += 1
+        self._anim_total = None
+        self._displayed(arrival, [rgb for rgb, _ in frames])
+
+    def _displayed(self, arrival, images):
+        self.frame_times.append((arrival, monotonic()))
+        if self.dump_dir:
+            from PIL import Image
+
+            os.makedirs(self.dump_dir, exist_ok=True)
+            n = self.pictures + self.animations
+            for i, rgb in enumerate(images):
+                path = os.path.join(self.dump_dir, f"frame_{n:06d}_{i:03d}.png")
+                Image.frombytes("RGB", self.profile.size, rgb).save(path)
+
+    def stats(self):
+        with self._lock:
+            delays = sorted(displayed - arrival for arrival, displayed in self.frame_times)
+            return {
+                "commands": {f"0x{cmd:02X}": count for cmd, count in sorted(self.commands.items())},
+                "pictures": self.pictures,
+                "animations": self.animations,
+                "errors": self.errors,
+                "brightness": self.brightness,
+                "box_mode": self.box_mode,
+                "p50_latency": delays[len(delays) // 2] if delays else None,
+            }
+
+
+class PixooEmulator:
+    """
+    Socket server in front of an EmulatedPixoo.
+
+    bandwidth (bytes per second) throttles how fast data is read from the
+    socket, so senders feel back-pressure as on a slow RFCOMM link; latency
+    (seconds) is added before each command takes effect.
+    """
+
+    def __init__(self, address, bandwidth=None, latency=0.0, dump_dir=None, profile=None):
+        self.address = address
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.device = EmulatedPixoo(dump_dir, profile)
+        self.bytes_received = 0
+        self.parse_errors = 0
+        self._started = monotonic()
+        self._closing = False
+        self._clients = set()
+        self._thread = None
+
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(address)
+        self._server.listen()
+        self.address = self._server.getsockname()
+
+    def url(self):
+        """
+        Address in the form accepted by Pixoo(...).
+        """
+        if isinstance(self.address, str):
+            return f"unix://{self.address}"
+        return f"tcp://{self.address[0]}:{self.address[1]}"
+
+    def serve_forever(self):
+        while not self._closing:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def start(self):
+        """
+        Serve from a background thread; returns self.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name="pixoo-emulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._closing = True
+        try:
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+        for conn in list(self._clients):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)  # like the device going out of range
+            except OSError:
+                pass
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def _serve_client(self, conn):
+        parser = SppParser()
+        read_size = 4096
+        if self.bandwidth:
+            # small reads and a small receive window make the throttling visible to the sender
+            read_size = max(64, min(4096, int(self.bandwidth // 50)))
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, read_size)
+        self._clients.add(conn)
+        with conn:
+            while True:
+                try:
+                    data = conn.recv(read_size)
+                except OSError:
+                    break
+                if not data:
+                    break
+                arrival = monotonic()
+                self.bytes_received += len(data)
+                for cmd, args in parser.feed(data):
+                    if self.latency:
+                        sleep(self.latency)
+                    self.device.handle(cmd, args, arrival)
+                if self.bandwidth:
+                    sleep(len(data) / self.bandwidth)
+        self._clients.discard(conn)
+        self.parse_errors += parser.errors
+
+    def stats(self):
+        elapsed = monotonic() - self._started
+        stats = self.device.stats()
+        stats.update({
+            "bytes_received": self.bytes_received,
+            "parse_errors": self.parse_errors,
+            "throughput_bytes_per_sec": self.bytes_received / elapsed if elapsed else 0.0,
+        })
+        return stats
+
+
+def parse_address(tcp=None, unix=None):
+    if unix:
+        return unix
+    host, _, port = (tcp or "127.0.0.1:7777").rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Emulated Pixoo device")
+    parser.add_argument("--tcp", metavar="HOST:PORT", help="listen on TCP (default 127.0.0.1:7777)")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead")
+    parser.add_argument("--bandwidth", type=float, help="simulated link bandwidth in bytes/s")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated per-command latency in seconds")
+    parser.add_argument("--dump-dir", help="save every displayed picture as PNG here")
+    parser.add_argument("--stats-interval", type=float, default=5.0, help="print stats every N seconds")
+    parser.add_argument("--profile", choices=list(PROFILES), default="16", help="panel resolution")
+    cli_args = parser.parse_args()
+
+    emulator = PixooEmulator(parse_address(cli_args.tcp, cli_args.unix), cli_args.bandwidth, cli_args.latency,
+                             cli_args.dump_dir, cli_args.profile).start()
+    print(f"Emulated Pixoo listening on {emulator.url()}")
+    try:
+        while True:
+            sleep(cli_args.stats_interval)
+            print(json.dumps(emulator.stats()))
+    except KeyboardInterrupt:
+        emulator.close()
@@ -1,21 +1,32 @@
-import pygame
+import argparse
+from time import monotonic, process_time
 
+from audio import AudioService
 
-def play_midi(file_path):
-    pygame.mixer.init()
-    pygame.mixer.music.load(file_path)
-    pygame.mixer.music.set_volume(0.5)
-    pygame.mixer.music.play()
+
+def play_midi(file_path, loop=False):
+    """
+    Start playing a MIDI file in the background. Returns the AudioService.
+    """
+    return AudioService(file_path, loop=loop).start()
 
 
 if __name__ == "__main__":
-    midi_file = "tetris.mid"  # Replace with the path to your MIDI file
-    play_midi(midi_file)
+    parser = argparse.ArgumentParser(description="Play the soundtrack")
+    parser.add_argument("midi_file", nargs="?", default="tetris.mid")
+    parser.add_argument("--loop", action="store_true", help="keep playing until Ctrl+C")
+    cli_args = parser.parse_args()
 
+    started_cpu = process_time()
+    started = monotonic()
+    audio = play_midi(cli_args.midi_file, cli_args.loop)
     try:
-        # Continue running the program until the music finishes playing
-        while pygame.mixer.music.get_busy():
-            pass
+        # sleep until the music finishes playing
+        audio.finished.wait()
     except KeyboardInterrupt:
         # Allow the user to stop the music with Ctrl+C
-        pygame.mixer.music.stop()
+        pass
+    audio.stop()
+    elapsed = monotonic() - started
+    print(f"CPU {(process_time() - started_cpu) / elapsed:.1%} over {elapsed:.0f}s, "
+          f"watcher {audio.watcher_cpu * 1000:.1f} ms in {audio.wakeups} wakeups")
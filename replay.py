@@ -0,0 +1,242 @@
+"""
+Compact game recordings and headless replay.
+
+A replay file is
+
+    b"TRPL", version, board width, board height   (one byte each after the magic)
+    varint zigzag(seed), varint tick rate
+    records: varint (tick delta << 3 | action)
+    END record, then varint score, lines, pieces and an 8-byte board digest
+
+The engine is deterministic for a given seed, so the records reproduce the
+game exactly. Most records are gravity steps a few dozen ticks apart and
+take a single byte. A recording cut short (crash, kill) has no END record
+and is replayed without verification.
+
+    python replay.py game.trpl                         # replay and verify
+    python replay.py game.trpl --frames-out frames.rgb  # dump device frames
+    python replay.py game.trpl --device tcp://127.0.0.1:4000
+"""
+import argparse
+import hashlib
+import struct
+import sys
+from time import perf_counter
+
+import tetris_engine
+from tetris_engine import TetrisEngine
+from tetris_render import BoardRenderer
+
+MAGIC = b"TRPL"
+VERSION = 1
+END = 7  # after the last action: the final state follows
+HEADER = struct.Struct("<4sBBB")
+
+
+def write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    """
+    Decode a varint at data[pos]. Returns (value, next position).
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+def board_digest(engine):
+    """
+    8-byte digest of the board cells and colours.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for row, colors in zip(engine.rows, engine.colors):
+        digest.update(row.to_bytes((engine.width + 7) // 8, "little"))
+        digest.update(colors)
+    return digest.digest()
+
+
+class ReplayWriter:
+    """
+    Streams (tick, action) records to a file. Use record as the game
+    scheduler's on_action hook, and finish() at the end of the session.
+    """
+
+    def __init__(self, path, seed, width=tetris_engine.GRID_WIDTH, height=tetris_engine.GRID_HEIGHT, tick_rate=60):
+        if not isinstance(seed, int):
+            raise ValueError("Replays need an integer seed")
+        self.file = open(path, "wb")
+        header = bytearray(HEADER.pack(MAGIC, VERSION, width, height))
+        write_varint(header, zigzag(seed))
+        write_varint(header, int(tick_rate))
+        self.file.write(header)
+        self.last_tick = 0
+        self.records = 0
+        self._buffer = bytearray()
+
+    def record(self, tick, action):
+        write_varint(self._buffer, (tick - self.last_tick) << 3 | action)
+        self.last_tick = tick
+        self.records += 1
+        if len(self._buffer) >= 4096:
+            self.file.write(self._buffer)
+            self._buffer.clear()
+
+    def finish(self, engine):
+        """
+        Write the END record with the final state and close the file.
+        """
+        write_varint(self._buffer, END)
+        for value in (engine.score, engine.lines, engine.pieces):
+            write_varint(self._buffer, value)
+        self._buffer += board_digest(engine)
+        self.close()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.write(self._buffer)
+            self._buffer.clear()
+            self.file.close()
+
+
+class Replay:
+    """
+    A parsed replay file: header fields, the (tick, action) records and the
+    recorded final state (None if the recording was cut short).
+    """
+
+    def __init__(self, data):
+        magic, version, self.width, self.height = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a replay file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported replay version {version}")
+        pos = HEADER.size
+        seed, pos = read_varint(data, pos)
+        self.seed = unzigzag(seed)
+        self.tick_rate, pos = read_varint(data, pos)
+
+        self.records = []
+        self.final = None
+        tick = 0
+        while pos < len(data):
+            value, pos = read_varint(data, pos)
+            tick += value >> 3
+            action = value & 7
+            if action == END:
+                final = []
+                for _ in range(3):
+                    item, pos = read_varint(data, pos)
+                    final.append(item)
+                self.final = tuple(final) + (bytes(data[pos:pos + 8]),)
+                break
+            self.records.append((tick, action))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    @property
+    def duration(self):
+        """
+        Game time covered, in seconds.
+        """
+        return self.records[-1][0] / self.tick_rate if self.records else 0.0
+
+
+def replay(recording, on_frame=None):
+    """
+    Re-simulate a Replay as fast as possible. on_frame(tick, rgb), if given,
+    receives every changed device frame. Returns the engine in its final
+    state.
+    """
+    engine = TetrisEngine(recording.width, recording.height, recording.seed)
+    renderer = BoardRenderer(recording.width, recording.height) if on_frame is not None else None
+    if renderer is not None and renderer.render(engine):
+        on_frame(0, renderer.buffer)
+    for tick, action in recording.records:
+        if action == tetris_engine.RESET:
+            engine.reset()
+        else:
+            engine.step(action)
+        if renderer is not None and renderer.render(engine):
+            on_frame(tick, renderer.buffer)
+    return engine
+
+
+def verify(recording, engine):
+    """
+    Compare the replayed engine with the recorded final state. Returns
+    True/False, or None when the recording has no final state.
+    """
+    if recording.final is None:
+        return None
+    return (engine.score, engine.lines, engine.pieces, board_digest(engine)) == recording.final
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a recorded Tetris game headlessly")
+    parser.add_argument("replay", help="replay file written by TetrisGame.py --record")
+    parser.add_argument("--frames-out", help="write each changed 16x16 RGB frame (raw, 768 bytes) to this file")
+    parser.add_argument("--device", help="send the frames to this device or emulator address")
+    parser.add_argument("--repeat", type=int, default=1, help="replay this many times (throughput runs)")
+    cli_args = parser.parse_args()
+
+    recording = Replay.load(cli_args.replay)
+    frames_file = open(cli_args.frames_out, "wb") if cli_args.frames_out else None
+    pixoo = None
+    if cli_args.device:
+        from client import Pixoo
+
+        pixoo = Pixoo(cli_args.device, cache=False)
+        pixoo.connect()
+
+    frame_count = 0
+
+    def emit(tick, rgb):
+        global frame_count
+        frame_count += 1
+        if frames_file is not None:
+            frames_file.write(rgb)
+        if pixoo is not None:
+            pixoo.draw_rgb(rgb)
+
+    started = perf_counter()
+    for _ in range(cli_args.repeat):
+        final_engine = replay(recording, emit if frames_file or pixoo else None)
+    elapsed = perf_counter() - started
+    if frames_file is not None:
+        frames_file.close()
+
+    records = len(recording.records) * cli_args.repeat
+    print(f"{len(recording.records)} records, {recording.duration:.1f}s of play, seed {recording.seed}")
+    print(f"replayed {records} records in {elapsed * 1000:.1f} ms ({records / elapsed:.0f} records/s), "
+          f"{frame_count} frames")
+    print(f"score {final_engine.score}, lines {final_engine.lines}, pieces {final_engine.pieces}")
+    result = verify(recording, final_engine)
+    if result is None:
+        print("no final state recorded, not verified")
+    elif result:
+        print("final state matches")
+    else:
+        print(f"MISMATCH: recorded score/lines/pieces {recording.final[:3]}")
+        sys.exit(1)
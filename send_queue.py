@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from time import perf_counter
+
+import frame_trace
+FRAME = "frame"  # still picture, only the newest pending one is sent
+ANIM = "anim"  # animation upload, only the newest pending one is sent
+CONTROL = "control"  # brightness, box mode, ... never dropped
+
+
+class SendQueue:
+    """
+    Background sender for a Pixoo.
+
+    Producers submit lists of encoded packets and get a Future right away;
+    a worker thread does the blocking socket writes (and reconnects). A newer
+    frame or animation replaces one still waiting in the queue, control
+    commands are always delivered in order. Futures resolve to True once the
+    packets are written and to False if they were superseded or dropped, or
+    the device was unreachable. Items submitted with a frame_id get their
+    send_start and send_end stamps in the frame tracer around the write.
+    """
+
+    def __init__(self, pixoo, maxsize=8):
+        self.pixoo = pixoo
+        self.maxsize = maxsize
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.send_time = 0.0  # seconds spent writing to the socket
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="pixoo-sender", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, drain=True, timeout=None):
+        """
+        Stop the worker. With drain=True, everything already queued is sent
+        first; otherwise pending items are dropped.
+        """
+        with self._cond:
+            self._stopping = True
+            if not drain:
+                while self._items:
+                    self._resolve(self._items.popleft()[2], False)
+                    self.dropped += 1
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, packets, kind=CONTROL, frame_id=None):
+        """
+        Queue packets for sending without blocking. Returns a Future.
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._cond:
+            if kind != CONTROL:
+                for item in self._items:
+                    if item[0] == kind:
+                        # latest wins: take over the older item's place in line
+                        self._resolve(item[2], False)
+                        item[1], item[2], item[3] = packets, future, frame_id
+                        self.coalesced += 1
+                        return future
+                if len(self._items) >= self.maxsize:
+                    self._drop_oldest_droppable()
+            self._items.append([kind, packets, future, frame_id])
+            self._cond.notify()
+        return future
+
+    def submit_async(self, packets, kind=CONTROL, frame_id=None):
+        """
+        Same as submit, but returns an awaitable for the running event loop.
+        """
+        return asyncio.wrap_future(self.submit(packets, kind, frame_id))
+
+    def pending(self):
+        with self._cond:
+            return len(self._items)
+
+    def _drop_oldest_droppable(self):
+        for item in self._items:
+            if item[0] != CONTROL:
+                self._items.remove(item)
+                self._resolve(item[2], False)
+                self.dropped += 1
+                return
+
+    @staticmethod
+    def _resolve(future, result):
+        if not future.done():
+            future.set_result(result)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._items or self._stopping)
+                if not self._items:
+                    return
+                kind, packets, future, frame_id = self._items.popleft()
+            tracer = frame_trace.tracer if frame_id is not None else None
+            if tracer is not None:
+                tracer.mark("send_start", frame_id)
+            started = perf_counter()
+            try:
+                sent = self.pixoo.send_packets(packets, kind=kind)
+            except Exception as e:
+                self.errors += 1
+                future.set_exception(e)
+            else:
+                self.send_time += perf_counter() - started
+                if sent:
+                    if tracer is not None:
+                        tracer.mark("send_end", frame_id)
+                    self.sent += 1
+                    self.bytes_sent += sum(len(packet) for packet in packets)
+                self._resolve(future, bool(sent))
@@ -1,29 +1,286 @@
+import argparse
+import threading
 import time
-import pyautogui
 
+import numpy as np
+from PIL import Image
+
+import encoder
+from device_profile import PROFILES, get_profile
+from frame_bus import FrameBus
+from frame_sender import FrameSender
+
+
+class ScreenSource:
+    """
+    Captures a screen region (left, top, width, height); by default the
+    centred square of the primary screen.
+    """
+
+    def __init__(self, region=None):
+        import pyautogui  # needs a display, only imported when capturing
+
+        self._pyautogui = pyautogui
+        if region is None:
+            width, height = pyautogui.size()
+            side = min(width, height)
+            region = ((width - side) // 2, (height - side) // 2, side, side)
+        self.region = tuple(region)
+
+    def capture(self):
+        return np.asarray(self._pyautogui.screenshot(region=self.region))
+
+
+class SyntheticSource:
+    """
+    Moving colour gradient, for running the pipeline without a display.
+    """
+
+    def __init__(self, size=64):
+        y, x = np.mgrid[0:size, 0:size]
+        self._x = x
+        self._y = y
+        self._t = 0
+
+    def capture(self):
+        self._t += 1
+        frame = np.empty(self._x.shape + (3,), dtype=np.uint8)
+        frame[..., 0] = (self._x * 4 + self._t * 3) & 0xFF
+        frame[..., 1] = (self._y * 4 + self._t) & 0xFF
+        frame[..., 2] = ((self._x + self._y) * 2 - self._t * 2) & 0xFF
+        return frame
+
+
+class VideoSource:
+    """
+    Frames of a video file or animated GIF, looped.
+    """
+
+    def __init__(self, path):
+        import imageio.v3 as iio
+
+        self._iio = iio
+        self.path = path
+        self._frames = iter(())
+
+    def capture(self):
+        for _ in range(2):
+            for frame in self._frames:
+                return np.asarray(frame)[..., :3]
+            self._frames = self._iio.imiter(self.path)
+        raise ValueError(f"No frames in {self.path}")
 
-def ss(interval, output_filename, target_size=(16, 16)):
-    while True:
-        screenshot = pyautogui.screenshot()
 
-        width, height = screenshot.size
+def box_downscale(frame, size=16):
+    """
+    Centre-crop an (H, W, 3) frame to a square and average it down to
+    size x size in integer arithmetic. Leftover rows/columns are cropped.
+    """
+    height, width = frame.shape[:2]
+    side = min(height, width)
+    block = side // size
+    if block < 1:
+        raise ValueError(f"Frame of {width}x{height} is smaller than {size}x{size}")
+    top = (height - block * size) // 2
+    left = (width - block * size) // 2
+    crop = frame[top:top + block * size, left:left + block * size, :3]
+    sums = crop.reshape(size, block, size, block, 3).sum(axis=(1, 3), dtype=np.uint32)
+    return (sums // (block * block)).astype(np.uint8)
 
-        min_dimension = min(width, height)
-        left = (width - min_dimension) // 2
-        top = (height - min_dimension) // 2
-        right = (width + min_dimension) // 2
-        bottom = (height + min_dimension) // 2
 
-        screenshot = screenshot.crop((left, top, right, bottom))
+class StageTimer:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
 
-        screenshot = screenshot.resize(target_size)
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
 
-        screenshot.save(output_filename)
-        time.sleep(interval)
+    def summary(self):
+        return {"count": self.count, "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+                "max_ms": self.max * 1000}
+
+
+class StreamPipeline:
+    """
+    Mirrors a source to a Pixoo in three concurrent stages: a capture thread
+    paced to fps, an encode thread, and the Pixoo's background sender. Each
+    stage only ever picks up the newest output of the previous one, so a
+    slow stage drops stale frames instead of building a backlog.
+    """
+
+    def __init__(self, source, pixoo, fps=20, size=None, quantizer=None, report_interval=5.0):
+        self.source = source
+        self.pixoo = pixoo
+        self.fps = fps
+        size = size or pixoo.profile.width
+        self.size = size
+        self.report_interval = report_interval
+        self.bus = FrameBus(size * size * 3)
+        self.sender = FrameSender(pixoo, max_fps=0, keepalive=0, quantizer=quantizer)
+        self.stages = {name: StageTimer() for name in ("capture", "downscale", "encode")}
+        self.captured = 0
+        self.encoded = 0
+        self.late = 0
+        self._running = False
+        self._threads = []
+        self._started = None
+
+    def start(self):
+        self.pixoo.start_background()
+        self._running = True
+        self._started = time.monotonic()
+        self._threads = [threading.Thread(target=self._capture_loop, name="stream-capture", daemon=True),
+                         threading.Thread(target=self._encode_loop, name="stream-encode", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self.bus.close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _capture_loop(self):
+        interval = 1.0 / self.fps
+        deadline = time.monotonic()
+        while self._running:
+            started = time.perf_counter()
+            try:
+                frame = self.source.capture()
+            except Exception as e:
+                print(f"Capture failed: {e}")
+                time.sleep(interval)
+                continue
+            captured = time.perf_counter()
+            small = box_downscale(frame, self.size)
+            self.stages["capture"].add(captured - started)
+            self.stages["downscale"].add(time.perf_counter() - captured)
+            self.captured += 1
+            self.bus.publish(small.tobytes())
+
+            deadline += interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -interval:
+                self.late += 1  # fell behind: skip the missed slots instead of bursting
+                deadline = time.monotonic()
+
+    def _encode_loop(self):
+        seq = 0
+        while self._running:
+            item = self.bus.wait(seq, timeout=0.5)
+            if item is None:
+                continue
+            seq, frame = item
+            started = time.perf_counter()
+            try:
+                self.sender.offer_rgb(frame)
+                self.sender.flush()
+            except Exception as e:
+                print(f"An error occurred: {e}")
+            self.stages["encode"].add(time.perf_counter() - started)
+            self.encoded += 1
+
+    def stats(self):
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        queue = self.pixoo.send_queue
+        stages = {name: timer.summary() for name, timer in self.stages.items()}
+        stats = {
+            "elapsed": elapsed,
+            "capture_fps": self.captured / elapsed if elapsed else 0.0,
+            "encode_fps": self.encoded / elapsed if elapsed else 0.0,
+            "late": self.late,
+            "unchanged": self.sender.skipped,
+            "bytes_per_frame": self.sender.bytes_per_frame(),
+            "stages": stages,
+        }
+        if queue is not None:
+            stats["send_fps"] = queue.sent / elapsed if elapsed else 0.0
+            stats["dropped"] = (self.captured - self.encoded) + queue.coalesced + queue.dropped
+            send_ms = queue.send_time / queue.sent * 1000 if queue.sent else 0.0
+            stages["send"] = {"count": queue.sent, "mean_ms": send_ms}
+        return stats
+
+    def report(self):
+        stats = self.stats()
+        line = (f"capture {stats['capture_fps']:.1f} fps, encode {stats['encode_fps']:.1f} fps, "
+                f"send {stats.get('send_fps', 0.0):.1f} fps, {stats['bytes_per_frame']:.0f} B/frame |")
+        for name, stage in stats["stages"].items():
+            line += f" {name} {stage['mean_ms']:.2f} ms"
+        print(line)
+
+    def run(self, duration=None):
+        """
+        Stream until interrupted (or for duration seconds), reporting
+        throughput and stage times every report_interval seconds.
+        """
+        self.start()
+        end = None if duration is None else time.monotonic() + duration
+        try:
+            while end is None or time.monotonic() < end:
+                wait = self.report_interval
+                if end is not None:
+                    wait = max(min(wait, end - time.monotonic()), 0)
+                time.sleep(wait)
+                self.report()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            stats = self.stats()
+            self.pixoo.stop_background()
+        return stats
+
+
+def ss(interval, output_filename, target_size=(16, 16), source=None):
+    """
+    Legacy path: write the downscaled capture to output_filename every
+    interval seconds, for main_script.py to poll.
+    """
+    source = source or ScreenSource()
+    deadline = time.monotonic()
+    while True:
+        small = box_downscale(source.capture(), target_size[0])
+        Image.fromarray(small, "RGB").save(output_filename)
+        deadline = max(deadline + interval, time.monotonic())
+        time.sleep(deadline - time.monotonic())
 
 
 if __name__ == "__main__":
-    interval = 0.01
-    output_filename = "image.png"
+    parser = argparse.ArgumentParser(description="Mirror the screen (or a video) to a Pixoo")
+    parser.add_argument("--source", choices=["screen", "synthetic", "video"], default="screen")
+    parser.add_argument("--video", help="video file or GIF for --source video")
+    parser.add_argument("--region", help="screen region to capture as left,top,width,height")
+    parser.add_argument("--device", help="device address (default: Pixoo.BDADDR in client.py)")
+    parser.add_argument("--fps", type=float, default=20, help="target capture rate")
+    parser.add_argument("--max-colors", type=int, help="quantize frames to at most this many colours")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--png", action="store_true", help="only write image.png for main_script.py to poll")
+    parser.add_argument("--profile", choices=list(PROFILES), default="16", help="panel resolution")
+    cli_args = parser.parse_args()
+
+    if cli_args.source == "screen":
+        region = tuple(int(v) for v in cli_args.region.split(",")) if cli_args.region else None
+        capture_source = ScreenSource(region)
+    elif cli_args.source == "video":
+        capture_source = VideoSource(cli_args.video)
+    else:
+        capture_source = SyntheticSource()
+
+    if cli_args.png:
+        ss(1.0 / cli_args.fps, "image.png", get_profile(cli_args.profile).size, capture_source)
+    else:
+        from client import Pixoo
 
-    ss(interval, output_filename)
+        pixoo = Pixoo(cli_args.device or Pixoo.BDADDR, profile=cli_args.profile)
+        pixoo.connect()
+        pixoo.connection.start_monitor()
+        quantizer = encoder.Quantizer(cli_args.max_colors) if cli_args.max_colors else None
+        StreamPipeline(capture_source, pixoo, cli_args.fps, quantizer=quantizer).run(cli_args.duration)
@@ -0,0 +1,60 @@
+"""
+encode_raw_image must give byte-identical output to the pure-Python
+reference encoder it replaced.
+"""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from client import Pixoo
+
+
+def offline_pixoo(profile=None):
+    return Pixoo("offline", cache=False, connection=False, profile=profile)
+
+
+def image_with_colors(nb_colors, size=16, mode="RGB"):
+    rng = np.random.default_rng(nb_colors)
+    colors = rng.choice(256 ** 3, size=nb_colors, replace=False)
+    colors = np.stack([(colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF], axis=1).astype(np.uint8)
+    # every colour appears at least once, in shuffled order
+    indices = rng.permutation(np.arange(size * size) % nb_colors)
+    img = Image.fromarray(colors[indices].reshape(size, size, 3), "RGB")
+    return img.convert(mode)
+
+
+def assert_same_encoding(pixoo, img, reference_img=None):
+    nb_colors, palette, pixel_data = pixoo.encode_raw_image(img)
+    ref_colors, ref_palette, ref_pixels = pixoo.encode_raw_image_reference(reference_img or img)
+    assert nb_colors == ref_colors
+    assert bytes(palette) == bytes(ref_palette)
+    assert bytes(pixel_data) == bytes(ref_pixels)
+
+
+@pytest.mark.parametrize("nb_colors", [1, 2, 3, 5, 256])
+def test_matches_reference(nb_colors):
+    assert_same_encoding(offline_pixoo(), image_with_colors(nb_colors))
+
+
+def test_rgba_input():
+    img = image_with_colors(5, mode="RGBA")
+    img.putalpha(128)
+    assert_same_encoding(offline_pixoo(), img)
+
+
+def test_gif_frame():
+    frames = [image_with_colors(n).quantize(n) for n in (3, 7)]
+    data = io.BytesIO()
+    frames[0].save(data, "GIF", save_all=True, append_images=frames[1:])
+    with Image.open(data) as gif:
+        for n in range(gif.n_frames):
+            gif.seek(n)
+            # the reference only reads RGB(A) pixels; draw_gif converts frames the same way
+            assert_same_encoding(offline_pixoo(), gif, gif.convert("RGB"))
+
+
+@pytest.mark.parametrize("profile", ["32", "64"])
+def test_scaled_to_profile(profile):
+    assert_same_encoding(offline_pixoo(profile), image_with_colors(5))
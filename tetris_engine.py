@@ -0,0 +1,259 @@
+"""
+Headless Tetris engine.
+
+The board is a list of integer bitmasks, one per row (bit x set means
+column x is filled), with a parallel colour plane. Pieces are precomputed
+bitmask rotations, so collision and line clears are a handful of bitwise
+operations. Nothing here depends on pygame: TetrisGame.py only renders it.
+"""
+import random
+
+GRID_WIDTH = 16
+GRID_HEIGHT = 16
+
+# Colors
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+CYAN = (0, 255, 255)
+MAGENTA = (255, 0, 255)
+YELLOW = (255, 255, 0)
+GREEN = (0, 255, 0)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+
+# Tetromino shapes
+SHAPES = [
+    [[1, 1, 1, 1]],
+    [[1, 1], [1, 1]],
+    [[1, 1, 1], [0, 1, 0]],
+    [[1, 1, 1], [1, 0, 0]],
+    [[1, 1, 1], [0, 0, 1]],
+    [[1, 1, 1], [0, 1, 0]],
+    [[1, 1, 1], [1, 0, 0]]
+]
+
+SHAPES_COLORS = [CYAN, YELLOW, GREEN, RED, BLUE, MAGENTA, WHITE]
+
+# Actions
+NONE = 0
+LEFT = 1
+RIGHT = 2
+DOWN = 3
+ROTATE = 4
+GRAVITY = 5
+RESET = 6  # start a new game (not a step() action; recorded in replays)
+
+ROW_SCORE = 100
+
+# Gravity: one row every BASE_GRAVITY seconds at level 0, GRAVITY_SPEEDUP
+# times faster per level, never faster than MIN_GRAVITY.
+LINES_PER_LEVEL = 10
+BASE_GRAVITY = 0.5
+GRAVITY_SPEEDUP = 0.85
+MIN_GRAVITY = 0.05
+
+
+def gravity_interval(level):
+    """
+    Seconds between gravity steps at the given level.
+    """
+    return max(BASE_GRAVITY * GRAVITY_SPEEDUP ** level, MIN_GRAVITY)
+
+
+def rotate_shape(shape):
+    """
+    Rotate a shape matrix the way the game always has: transpose, then
+    reverse the rows (a quarter turn counter-clockwise).
+    """
+    rotated = [[shape[y][x] for y in range(len(shape))] for x in range(len(shape[0]))]
+    rotated.reverse()
+    return rotated
+
+
+def shape_masks(shape):
+    """
+    (row masks, width, height) for a shape matrix, column 0 in bit 0.
+    """
+    masks = tuple(sum(1 << x for x, cell in enumerate(row) if cell) for row in shape)
+    return masks, len(shape[0]), len(shape)
+
+
+def _rotations(shape):
+    rotations = []
+    for _ in range(4):
+        rotations.append(shape_masks(shape))
+        shape = rotate_shape(shape)
+    return tuple(rotations)
+
+
+PIECES = tuple(_rotations(shape) for shape in SHAPES)
+
+
+class TetrisEngine:
+    """
+    Game state plus step(action). Randomness comes from a private
+    random.Random, so a seed reproduces a game exactly.
+    """
+
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, seed=None):
+        self.width = width
+        self.height = height
+        self.full_row = (1 << width) - 1
+        self.rng = random.Random(seed)
+        self.version = 0  # bumped on every visible change, never reset
+        self.next_shape = None
+        self.next_color = None
+        self.reset()
+
+    def reset(self):
+        """
+        Empty the board and spawn the first piece. The RNG keeps going, so a
+        seeded session stays reproducible across restarts.
+        """
+        self.rows = [0] * self.height
+        self.colors = [bytearray(self.width) for _ in range(self.height)]  # colour index + 1, 0 for empty
+        self.score = 0
+        self.lines = 0
+        self.pieces = 0
+        self.moves = 0
+        self.game_over = False
+        self.last_cleared = 0
+        self.spawn()
+
+    def spawn(self):
+        """
+        Bring in the next piece at the top centre and draw the one after it.
+        Sets game_over if it does not fit. Pieces are drawn in the same order
+        as when there was no preview, so seeded games play out unchanged.
+        """
+        if self.next_shape is None:
+            self._draw_next()
+        self.shape = self.next_shape
+        self.color = self.next_color
+        self._draw_next()
+        self.rotation = 0
+        masks, w, h = PIECES[self.shape][0]
+        self.x = self.width // 2 - w // 2
+        self.y = 0
+        self.pieces += 1
+        self.version += 1
+        if self.collides(PIECES[self.shape][0], self.x, self.y):
+            self.game_over = True
+
+    def _draw_next(self):
+        self.next_shape = self.rng.randrange(len(SHAPES))
+        self.next_color = self.rng.randrange(len(SHAPES_COLORS))
+
+    def collides(self, piece, x, y):
+        masks, w, h = piece
+        if x < 0 or x + w > self.width or y + h > self.height:
+            return True
+        rows = self.rows
+        for i, mask in enumerate(masks):
+            if rows[y + i] & (mask << x):
+                return True
+        return False
+
+    @property
+    def piece(self):
+        """
+        (row masks, width, height) of the falling piece in its current rotation.
+        """
+        return PIECES[self.shape][self.rotation]
+
+    def step(self, action):
+        """
+        Apply one action. Returns True if the board or falling piece changed.
+        GRAVITY moves the piece down one row, or locks it, clears full rows
+        and spawns the next one.
+        """
+        if self.game_over or action == NONE:
+            return False
+        self.moves += 1
+        piece = PIECES[self.shape][self.rotation]
+        if action == LEFT:
+            return self._move(piece, self.x - 1, self.y)
+        if action == RIGHT:
+            return self._move(piece, self.x + 1, self.y)
+        if action == DOWN:
+            return self._move(piece, self.x, self.y + 1)
+        if action == ROTATE:
+            rotation = (self.rotation + 1) & 3
+            if self.collides(PIECES[self.shape][rotation], self.x, self.y):
+                return False
+            self.rotation = rotation
+            self.version += 1
+            return True
+        if action == GRAVITY:
+            if not self._move(piece, self.x, self.y + 1):
+                self.lock()
+            return True
+        raise ValueError(f"Unknown action: {action}")
+
+    def _move(self, piece, x, y):
+        if self.collides(piece, x, y):
+            return False
+        self.x = x
+        self.y = y
+        self.version += 1
+        return True
+
+    def lock(self):
+        """
+        Merge the falling piece into the board, clear rows, spawn the next.
+        """
+        masks, w, h = PIECES[self.shape][self.rotation]
+        x, y = self.x, self.y
+        color = self.color + 1
+        for i, mask in enumerate(masks):
+            self.rows[y + i] |= mask << x
+            row_colors = self.colors[y + i]
+            col = x
+            while mask:
+                if mask & 1:
+                    row_colors[col] = color
+                mask >>= 1
+                col += 1
+        self.last_cleared = self.clear_rows(y, y + h)
+        self.spawn()
+
+    def clear_rows(self, top=0, bottom=None):
+        """
+        Remove full rows between top and bottom (the only rows a lock can
+        fill) and shift everything above down. Returns the number cleared.
+        """
+        bottom = self.height if bottom is None else bottom
+        full = [row for row in range(top, bottom) if self.rows[row] == self.full_row]
+        for row in full:
+            del self.rows[row]
+            del self.colors[row]
+            self.rows.insert(0, 0)
+            self.colors.insert(0, bytearray(self.width))
+        self.score += ROW_SCORE * len(full)
+        self.lines += len(full)
+        return len(full)
+
+    @property
+    def level(self):
+        return self.lines // LINES_PER_LEVEL
+
+    def piece_cells(self):
+        """
+        Yield (x, y) for every cell of the falling piece.
+        """
+        masks, w, h = PIECES[self.shape][self.rotation]
+        for i, mask in enumerate(masks):
+            for col in range(w):
+                if mask >> col & 1:
+                    yield self.x + col, self.y + i
+
+    def cell_color(self, x, y):
+        """
+        RGB colour of a locked cell, or None if it is empty.
+        """
+        index = self.colors[y][x]
+        return SHAPES_COLORS[index - 1] if index else None
+
+    @property
+    def piece_color(self):
+        return SHAPES_COLORS[self.color]
@@ -0,0 +1,62 @@
+"""
+Render a TetrisEngine at device resolution: one pixel per cell (or a square
+of scale x scale pixels on a larger panel), written into a persistent RGB
+buffer that can be published or encoded as is.
+"""
+from tetris_engine import BLACK, SHAPES_COLORS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class BoardRenderer:
+    """
+    Keeps a bytearray of the board's RGB pixels in sync with an engine of
+    width x height cells. render() rewrites it in place and only does work
+    when the engine has changed.
+    """
+
+    def __init__(self, width, height, background=BLACK, use_numpy=None, scale=1):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.size = (width * scale, height * scale)  # in pixels
+        self.buffer = bytearray(width * height * scale * scale * 3)
+        # colour plane value -> RGB; index 0 is an empty cell
+        self.colors = [bytes(background)] + [bytes(color) for color in SHAPES_COLORS]
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        if self.use_numpy:
+            self._lut = np.array([tuple(color) for color in self.colors], dtype=np.uint8)
+            self._pixels = np.frombuffer(self.buffer, dtype=np.uint8).reshape(height * scale, width * scale, 3)
+        self._version = None
+
+    def render(self, engine):
+        """
+        Draw the board and falling piece. Returns True if the buffer changed.
+        """
+        if engine.version == self._version:
+            return False
+        self._version = engine.version
+
+        scale = self.scale
+        if self.use_numpy:
+            cells = np.frombuffer(b"".join(engine.colors), dtype=np.uint8).reshape(self.height, self.width)
+            if scale > 1:
+                cells = cells.repeat(scale, axis=0).repeat(scale, axis=1)
+            self._pixels[...] = self._lut[cells]
+        else:
+            colors = self.colors
+            row_size = self.size[0] * 3
+            for y, row in enumerate(engine.colors):
+                line = b"".join([colors[index] * scale for index in row])
+                for i in range(y * scale, (y + 1) * scale):
+                    self.buffer[i * row_size:(i + 1) * row_size] = line
+
+        color = self.colors[engine.color + 1] * scale
+        for x, y in engine.piece_cells():
+            for i in range(y * scale, (y + 1) * scale):
+                offset = (i * self.size[0] + x * scale) * 3
+                self.buffer[offset:offset + len(color)] = color
+        return True
@@ -0,0 +1,76 @@
+"""
+Scrolling text frames for Pixoo.draw_text.
+
+The string is laid out once into a wide strip from cached glyph masks, and
+each frame is a 16-pixel window sliced out of it, instead of redrawing the
+whole string for every shift.
+"""
+import functools
+import os
+
+from PIL import Image, ImageDraw, ImageFont
+
+DEFAULT_FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "PIXELADE.TTF")
+
+
+@functools.lru_cache(maxsize=16)
+def load_font(font_path, font_size):
+    return ImageFont.truetype(font_path, font_size)
+
+
+@functools.lru_cache(maxsize=2048)
+def load_glyph(font_path, font_size, char):
+    """
+    Returns (mask, x offset, y offset, advance) for one character. The mask is
+    None for characters that draw nothing, such as spaces.
+    """
+    font = load_font(font_path, font_size)
+    left, top, right, bottom = font.getbbox(char)
+    mask = None
+    if right > left and bottom > top:
+        mask = Image.new("L", (right - left, bottom - top), 0)
+        ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+    return mask, left, top, font.getlength(char)
+
+
+def render_strip(text, font_size, text_color, background_color, width=16, height=16, font_path=DEFAULT_FONT):
+    """
+    Lay the text out on a strip wide enough for every scroll position: it
+    starts just off the right edge of the first window, like the frames the
+    old per-shift renderer produced.
+    """
+    shifts = len(text) * font_size
+    strip = Image.new("RGB", (width + shifts, height), background_color)
+    x = width
+    y = (height - font_size) // 2
+    for char in text:
+        mask, left, top, advance = load_glyph(font_path, font_size, char)
+        if mask is not None:
+            strip.paste(text_color, (round(x) + left, y + top), mask)
+        x += advance
+    return strip
+
+
+def scroll_frames(text, font_size, text_color, background_color, width=16, height=16, font_path=DEFAULT_FONT):
+    """
+    Yield (rgb bytes, repeat count) for each window of the scrolling text.
+    Consecutive identical windows are merged into one frame with a higher
+    repeat count.
+    """
+    strip = render_strip(text, font_size, text_color, background_color, width, height, font_path)
+    row_size = strip.width * 3
+    data = strip.tobytes()
+    previous = None
+    repeat = 0
+    for shift in range(len(text) * font_size):
+        start = shift * 3
+        frame = b"".join(data[y * row_size + start:y * row_size + start + width * 3] for y in range(height))
+        if frame == previous:
+            repeat += 1
+            continue
+        if previous is not None:
+            yield previous, repeat
+        previous = frame
+        repeat = 1
+    if previous is not None:
+        yield previous, repeat
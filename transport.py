@@ -0,0 +1,118 @@
+"""
+Socket transports for talking to a Pixoo: the real device over Bluetooth
+RFCOMM, an emulator (see pixoo_emulator.py) over TCP or a Unix socket, or
+the frame server (see frame_server.py) that shares one device link.
+"""
+import socket
+from urllib.parse import parse_qs, urlsplit
+
+SERVER_HELLO = b"PXFS"  # a frame server client's hello line: PXFS <priority> <name>
+DEFAULT_PRIORITY = 10
+
+
+class Transport:
+    """
+    Opens a connected stream socket to a device.
+    """
+
+    settle_time = 0  # seconds to wait after connecting before sending
+
+    def open(self, timeout=None):
+        raise NotImplementedError
+
+    def _open(self, family, proto, address, timeout):
+        sock = socket.socket(family, socket.SOCK_STREAM, proto)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(address)
+            sock.settimeout(None)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+class BluetoothTransport(Transport):
+    """
+    Serial port profile over RFCOMM, as spoken by the Pixoo itself.
+    """
+
+    settle_time = 1  # mandatory to wait at least 1 second
+
+    def __init__(self, mac_address, channel=1):
+        self.mac_address = mac_address
+        self.channel = channel
+
+    def open(self, timeout=None):
+        return self._open(socket.AF_BLUETOOTH, socket.BTPROTO_RFCOMM, (self.mac_address, self.channel), timeout)
+
+    def __str__(self):
+        return self.mac_address
+
+
+class TcpTransport(Transport):
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    def open(self, timeout=None):
+        sock = self._open(socket.AF_INET, 0, (self.host, self.port), timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def __str__(self):
+        return f"tcp://{self.host}:{self.port}"
+
+
+class UnixTransport(Transport):
+    def __init__(self, path):
+        self.path = path
+
+    def open(self, timeout=None):
+        return self._open(socket.AF_UNIX, 0, self.path, timeout)
+
+    def __str__(self):
+        return f"unix://{self.path}"
+
+
+class ServerTransport(UnixTransport):
+    """
+    Connection to a frame server. The hello line sent after connecting
+    gives the server this client's priority and name; after that the
+    client speaks plain SPP, as to a device.
+    """
+
+    def __init__(self, path, priority=DEFAULT_PRIORITY, name=""):
+        super().__init__(path)
+        self.priority = priority
+        self.name = name
+
+    def open(self, timeout=None):
+        sock = super().open(timeout)
+        try:
+            sock.sendall(f"{SERVER_HELLO.decode()} {int(self.priority)} {self.name}\n".encode())
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def __str__(self):
+        return f"server://{self.path}?priority={self.priority}" + (f"&name={self.name}" if self.name else "")
+
+
+def transport_from_address(address):
+    """
+    Pick a transport from an address string: "tcp://host:port",
+    "unix:///path/to/socket", "server:///path/to/socket?priority=20&name=text"
+    for a frame server, or a Bluetooth MAC address.
+    """
+    if address.startswith("server://"):
+        url = urlsplit(address)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return ServerTransport(url.path, int(query.get("priority", DEFAULT_PRIORITY)), query.get("name", ""))
+    if address.startswith("tcp://"):
+        host, _, port = address[len("tcp://"):].rpartition(":")
+        return TcpTransport(host, int(port))
+    if address.startswith("unix://"):
+        return UnixTransport(address[len("unix://"):])
+    return BluetoothTransport(address)